@@ -360,12 +360,11 @@ class RobokassaService:
 
             username = payment_data.get('Shp_username')
             payment_id = payment_data.get('Shp_payment_id')
-            try:
-                payment = PaymentService.get_payment_details(payment_id)
-                logger.info(f"Found payment in DB: {payment}")
-            except Payment.DoesNotExist:
+            payment = PaymentService.get_payment_details(inv_id)
+            if payment is None:
                 logger.error(f"Error - Payment with ID {inv_id} not found in database")
                 return False, "Платеж не найден"
+            logger.info(f"Found payment in DB: {payment}")
             data = payment.extra_field
             for item in data["items_data"]:
                 if item["product_type"] == "subscription_service":
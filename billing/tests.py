@@ -1,3 +1,132 @@
-from django.test import TestCase
+import hashlib
+import itertools
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from games.tests import QueryBudgetMixin, seed_catalog
+from subscriptions.tests import seed_subscriptions
+
+from .models import Payment, PaymentItems
+from .services import RobokassaService, logger
+
+ROBOKASSA_SETTINGS = {
+    "ROBOKASSA_MERCHANT_LOGIN": "shop",
+    "ROBOKASSA_PASSWORD1": "password-one",
+    "ROBOKASSA_PASSWORD2": "password-two",
+    "ROBOKASSA_TEST_MODE": False,
+    "ROBOKASSA_RESULT_URL": "https://example.com/result",
+    "ROBOKASSA_SUCCESS_URL": "https://example.com/success",
+    "ROBOKASSA_FAIL_URL": "https://example.com/fail",
+}
+
+
+@override_settings(**ROBOKASSA_SETTINGS)
+class BillingEndpointsQueryBudgetTest(QueryBudgetMixin, TestCase):
+    INITIATE_BUDGET = 8
+    RESULT_BUDGET = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.games = seed_catalog(10)
+        cls.consoles, cls.services = seed_subscriptions(5)
+
+    def game_items(self, count):
+        return [
+            {"product_type": "game", "price_id": str(game.prices.first().id), "quantity": 1}
+            for game in self.games[:count]
+        ]
+
+    def subscription_items(self, count):
+        return [
+            {
+                "product_type": "subscription_service",
+                "service_id": str(service.id),
+                "period_id": str(service.periods.first().id),
+                "console_id": str(self.consoles[0].id),
+                "level": "Extra",
+                "quantity": 1,
+            }
+            for service in self.services[:count]
+        ]
+
+    def setUp(self):
+        super().setUp()
+        invoice_ids = (str(invoice_id) for invoice_id in itertools.count(1))
+        for patcher in (
+            mock.patch.object(RobokassaService, "generate_invoice_id", side_effect=lambda: next(invoice_ids)),
+            mock.patch.object(logger, "disabled", True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def initiate(self, items):
+        return self.count_queries(
+            "post", reverse("billing:initiate_payment"),
+            data={"email": "buyer@example.com", "username": "buyer", "items": items},
+            content_type="application/json",
+        )
+
+    def test_initiate_payment_with_games(self):
+        counts = [self.initiate(self.game_items(count)) for count in (1, 5, 10)]
+        self.assertQueryBudget(self.INITIATE_BUDGET, counts)
+
+    def test_initiate_payment_with_mixed_items(self):
+        counts = [
+            self.initiate(self.game_items(count) + self.subscription_items(count))
+            for count in (1, 5)
+        ]
+        self.assertQueryBudget(self.INITIATE_BUDGET, counts)
+
+    def create_paid_payment(self, items_count):
+        prices = [game.prices.first() for game in self.games[:items_count]]
+        amount = sum(price.discounted_price for price in prices)
+        payment = Payment.objects.create(
+            username="buyer", email="buyer@example.com", invoice_id=f"{10000 + items_count}",
+            amount=amount, description="test",
+            extra_field={"items_data": [
+                {"product_type": "game", "product_id": str(price.game_id), "price": str(price.discounted_price),
+                 "quantity": 1, "extra": {}}
+                for price in prices
+            ]},
+        )
+        PaymentItems.objects.bulk_create([
+            PaymentItems(payment=payment, product_type="game", game_id=price.game_id,
+                         price=price.discounted_price, quantity=1)
+            for price in prices
+        ])
+        return payment
+
+    def notification(self, payment):
+        out_sum = f"{payment.amount:.2f}"
+        shp = {"Shp_payment_id": str(payment.id), "Shp_username": payment.username}
+        signature = f"{out_sum}:{payment.invoice_id}:{ROBOKASSA_SETTINGS['ROBOKASSA_PASSWORD2']}"
+        for key, value in sorted(shp.items()):
+            signature += f":{key}={value}"
+        return {
+            "OutSum": out_sum,
+            "InvId": payment.invoice_id,
+            "SignatureValue": hashlib.md5(signature.encode("utf-8")).hexdigest(),
+            **shp,
+        }
+
+    def test_payment_result(self):
+        counts = []
+        for items_count in (1, 5, 10):
+            payment = self.create_paid_payment(items_count)
+            counts.append(self.count_queries("post", reverse("billing:payment_result"), data=self.notification(payment)))
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, "success")
+        self.assertQueryBudget(self.RESULT_BUDGET, counts)
+
+    def test_process_payment_looks_up_invoice_id(self):
+        payment = self.create_paid_payment(2)
+        # Shp_payment_id — первичный ключ платежа, а не номер счёта: искать по нему нельзя.
+        success, message = RobokassaService.process_payment(self.notification(payment))
+        self.assertTrue(success, message)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "success")
+
+        unknown = {**self.notification(payment), "InvId": "99999"}
+        self.assertEqual(RobokassaService.process_payment(unknown), (False, "Платеж не найден"))
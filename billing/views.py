@@ -35,13 +35,22 @@ class InitiatePayment(APIView):
 
             items_for_payment = []
 
+            subscription_lookups = SubscriptionPurchaseService.load_lookups(
+                [item for item in items_data if item["product_type"] == "subscription_service"]
+            )
+            game_prices = GamePurchaseService.load_prices(
+                [item for item in items_data if item["product_type"] == "game"]
+            )
+
             for item in items_data:
                 if item["product_type"] == "subscription_service":
-                    sub_items = SubscriptionPurchaseService.prepare_subscription_purchase_items(item)
+                    sub_items = SubscriptionPurchaseService.prepare_subscription_purchase_items(
+                        item, subscription_lookups
+                    )
 
                     items_for_payment.extend(sub_items)
                 elif item["product_type"] == "game":
-                    game_items = GamePurchaseService.prepare_game_purchase_items(item)
+                    game_items = GamePurchaseService.prepare_game_purchase_items(item, game_prices)
                     items_for_payment.extend(game_items)
                 else:
                     logger.warning(f"Unknown product_type: {item['product_type']}")
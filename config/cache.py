@@ -0,0 +1,392 @@
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+CATALOG = "catalog"
+# Журнал id игр, чьи строки снимка каталога изменились (games.indexes.CatalogSnapshot).
+CATALOG_ROWS = "catalog_rows"
+FACETS = "facets"
+SUBSCRIPTIONS = "subscriptions"
+TITLES = "titles"
+
+
+class LocalCache:
+    """
+    Кэш первого уровня в памяти процесса: LRU с ограничением размера и TTL.
+    Значения отдаются без копирования — их нельзя изменять.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + min(ttl or self.ttl, self.ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+local_cache = LocalCache(
+    getattr(settings, "LOCAL_CACHE_MAX_SIZE", 1000),
+    getattr(settings, "LOCAL_CACHE_TTL", 60),
+)
+_local_versions = {}
+
+
+def clear_local():
+    local_cache.clear()
+    _local_versions.clear()
+
+
+def version_key(namespace):
+    return f"version:{namespace}"
+
+
+def _shared_version(namespace):
+    version = cache.get(version_key(namespace))
+    if version is None:
+        cache.add(version_key(namespace), time.time_ns() // 1000, None)
+        version = cache.get(version_key(namespace)) or 0
+    return version
+
+
+def get_version(namespace):
+    """
+    Текущая версия пространства ключей. Общий счётчик опрашивается не чаще
+    раза в CACHE_VERSION_POLL_INTERVAL — так инвалидация из одного воркера
+    (например, правка в админке) доходит до остальных за это время.
+    Если счётчик вытеснен из кэша, он заводится заново от текущего времени.
+    """
+    now = time.monotonic()
+    known = _local_versions.get(namespace)
+    if known is not None and now - known[1] < getattr(settings, "CACHE_VERSION_POLL_INTERVAL", 1):
+        return known[0]
+    version = _shared_version(namespace)
+    _local_versions[namespace] = (version, now)
+    return version
+
+
+def _bump(namespace):
+    try:
+        cache.incr(version_key(namespace))
+    except ValueError:
+        cache.add(version_key(namespace), time.time_ns() // 1000, None)
+    _local_versions.pop(namespace, None)
+
+
+def bump_version(*namespaces):
+    """
+    Инвалидирует все ключи пространства. Версия сдвигается сразу и ещё раз после
+    коммита: иначе соседний воркер успеет закэшировать данные, прочитанные до коммита.
+    """
+    for namespace in namespaces:
+        _bump(namespace)
+        transaction.on_commit(lambda namespace=namespace: _bump(namespace))
+
+
+def change_key(namespace, version):
+    return f"changes:{namespace}:{version}"
+
+
+def _publish_change(namespace, change):
+    try:
+        version = cache.incr(version_key(namespace))
+    except ValueError:
+        # Счётчик вытеснен: журнал начнётся заново, читатели перезагрузятся целиком.
+        _bump(namespace)
+        return
+    cache.set(change_key(namespace, version), change, settings.CHANGE_LOG_TIMEOUT)
+    _local_versions.pop(namespace, None)
+
+
+def publish_change(namespace, change):
+    """
+    Сдвигает версию пространства после коммита и кладёт под новой версией само
+    изменение. Индексы в памяти воркеров догоняют версию, применяя изменения
+    по порядку (get_changes), вместо полной перезагрузки.
+    """
+    transaction.on_commit(lambda: _publish_change(namespace, change))
+
+
+def get_changes(namespace, since, until):
+    """Изменения с версиями (since, until] по порядку; None — журнал неполон и нужна полная перезагрузка."""
+    if since is None or not since < until <= since + settings.CHANGE_LOG_MAX:
+        return None
+    keys = [change_key(namespace, version) for version in range(since + 1, until + 1)]
+    found = cache.get_many(keys)
+    if len(found) != len(keys):
+        return None
+    return [found[key] for key in keys]
+
+
+def tiered_set(key, value, timeout):
+    local_cache.set(key, value, timeout)
+    try:
+        cache.set(key, value, timeout)
+    except Exception:
+        logger.exception("Не удалось сохранить %s в общий кэш", key)
+
+
+def entry_key(namespace, *parts):
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+def _is_fresh(entry, version, now):
+    return entry["version"] == version and now < entry["fresh_until"]
+
+
+def _store(key, version, data, timeout):
+    entry = {"version": version, "data": data, "fresh_until": time.time() + timeout}
+    tiered_set(key, entry, timeout + settings.CACHE_STALE_TTL)
+    return entry
+
+
+def _rebuild(key, version, loader, timeout):
+    data = loader()
+    if data is None:
+        return None
+    return _store(key, version, data, timeout)
+
+
+def _refresh(key, version, loader, timeout, background):
+    """
+    Пересборка под блокировкой; если ключ уже пересобирает другой воркер — ничего не делает.
+    В фоне пересобираются только значения обычных функций-загрузчиков; загрузчик,
+    привязанный к запросу (cached_response), выполняется здесь же и возвращает новую запись.
+    """
+    lock_key = f"lock:{key}"
+    if not cache.add(lock_key, 1, settings.CACHE_LOCK_TIMEOUT):
+        return None
+    threaded = background and settings.CACHE_REFRESH_IN_BACKGROUND
+
+    def refresh():
+        try:
+            return _rebuild(key, version, loader, timeout)
+        except Exception:
+            logger.exception("Не удалось обновить %s", key)
+        finally:
+            cache.delete(lock_key)
+            if threaded:
+                connections.close_all()
+
+    if threaded:
+        threading.Thread(target=refresh, daemon=True).start()
+        return None
+    return refresh()
+
+
+def _rebuild_single_flight(key, version, loader, timeout):
+    """
+    Пересобирает значение только в одном воркере: остальные ждут появления
+    записи в общем кэше до CACHE_LOCK_WAIT секунд и лишь потом считают сами.
+    """
+    lock_key = f"lock:{key}"
+    if cache.add(lock_key, 1, settings.CACHE_LOCK_TIMEOUT):
+        try:
+            return _rebuild(key, version, loader, timeout)
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None and entry["version"] == version:
+            local_cache.set(key, entry)
+            return entry
+        if cache.get(lock_key) is None:
+            break
+    return _rebuild(key, version, loader, timeout)
+
+
+def get_entry(namespace, parts, loader, timeout, background=True):
+    """
+    Запись {version, data, fresh_until} из L1, затем из общего кэша, иначе из loader();
+    None не кэшируется.
+
+    Устаревшая запись (по времени или по версии) ещё CACHE_STALE_TTL секунд
+    отдаётся как есть, пока один воркер её пересобирает: с background — в фоновом
+    потоке, без него — прямо в своём запросе. За CACHE_REFRESH_AHEAD секунд
+    до истечения свежая запись обновляется заранее. Без записи значение
+    пересобирает один воркер, остальные ждут его результата.
+    """
+    key = entry_key(namespace, *parts)
+    version = get_version(namespace)
+    now = time.time()
+
+    entry = local_cache.get(key)
+    if entry is None or not _is_fresh(entry, version, now):
+        entry = cache.get(key) or entry
+        if entry is not None:
+            local_cache.set(key, entry)
+
+    if entry is not None:
+        if _is_fresh(entry, version, now):
+            if now > entry["fresh_until"] - settings.CACHE_REFRESH_AHEAD:
+                entry = _refresh(key, version, loader, timeout, background) or entry
+            return entry
+        if now < entry["fresh_until"] + settings.CACHE_STALE_TTL:
+            return _refresh(key, version, loader, timeout, background) or entry
+
+    return _rebuild_single_flight(key, version, loader, timeout)
+
+
+def get_or_set(namespace, parts, loader, timeout):
+    """Значение записи get_entry; loader — обычная функция без аргументов, её можно вызвать в фоне."""
+    entry = get_entry(namespace, parts, loader, timeout)
+    return None if entry is None else entry["data"]
+
+
+def weak_etag(state):
+    # Слабый: одно и то же представление отдаётся и сжатым, и без сжатия.
+    return f'W/"{hashlib.md5(repr(state).encode()).hexdigest()}"'
+
+
+def _accepts_gzip(request):
+    return "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", "")
+
+
+def _encoded_response(request, entry, content_type):
+    if entry["gzip"] is not None and _accepts_gzip(request):
+        response = HttpResponse(entry["gzip"], content_type=content_type)
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(entry["content"], content_type=content_type)
+    response["Content-Length"] = str(len(response.content))
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+VALIDATOR_HEADERS = ("ETag", "Last-Modified")
+
+
+def cached_response(name, namespace, renderer_class=None):
+    """
+    Кэширует успешные (200) ответы DRF-вьюхи в памяти процесса и в общем кэше
+    по пути и нормализованным query-параметрам. Время жизни — settings.API_RESPONSE_CACHE_TIMEOUT[name].
+
+    С renderer_class в кэше лежит уже отрендеренное тело и его gzip-вариант:
+    попадание отдаёт готовые байты без кодирования и сжатия.
+
+    Загрузчик здесь — сама вьюха с текущим запросом, поэтому устаревшую запись
+    пересобирает не фоновый поток, а запрос воркера, взявшего блокировку;
+    остальные тем временем отдают устаревшее тело.
+
+    ETag и Last-Modified, которые выставила вьюха (config.http.conditional_get
+    внутри этого декоратора), хранятся вместе с телом, и условный запрос
+    сверяется с ними: валидаторы всегда описывают отданное тело, а не текущее
+    состояние базы, которое может его опережать.
+    """
+    timeout = getattr(settings, "API_RESPONSE_CACHE_TIMEOUT", {}).get(name)
+
+    def decorator(view):
+        if not timeout:
+            return view
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+            encoded = renderer_class is not None and isinstance(getattr(request, "accepted_renderer", None),
+                                                                renderer_class)
+            computed = {}
+
+            def loader():
+                response = view(request, *args, **kwargs)
+                computed["response"] = response
+                if response.status_code != 200:
+                    return None
+                headers = {name: response[name] for name in VALIDATOR_HEADERS if response.has_header(name)}
+                if not encoded:
+                    # Только JSON-значения: ReturnDict/ReturnList держат сериализатор с экземплярами моделей.
+                    # Рендерер вьюхи, а не JSONRenderer: в данных могут быть готовые фрагменты RawJSON.
+                    content = (renderer_class or JSONRenderer)().render(response.data)
+                    return {"payload": json.loads(content), "headers": headers}
+                content = renderer_class().render(response.data, renderer_class.media_type)
+                compressed = gzip.compress(content, compresslevel=6)
+                return {
+                    "content": content,
+                    "gzip": compressed if len(compressed) < len(content) else None,
+                    "headers": headers,
+                }
+
+            parts = (name, request.path, params, "encoded" if encoded else "data")
+            entry = get_entry(namespace, parts, loader, timeout, background=False)
+            if entry is None:
+                return computed["response"]
+            if encoded:
+                response = _encoded_response(request, entry["data"], renderer_class.media_type)
+            elif "response" in computed:
+                return computed["response"]
+            else:
+                response = Response(entry["data"]["payload"])
+            for header, value in entry["data"]["headers"].items():
+                response[header] = value
+            if not entry["data"]["headers"] and entry["version"] != get_version(namespace):
+                # Устаревшее тело без своих валидаторов: они — от его версии, а не от текущей,
+                # иначе следующий условный запрос получит 304 на старые данные.
+                response["ETag"] = weak_etag((name, namespace, entry["version"]))
+                response["Last-Modified"] = http_date(entry["fresh_until"] - timeout)
+            return get_conditional_response(
+                request,
+                etag=response.get("ETag"),
+                last_modified=parse_http_date_safe(response.get("Last-Modified")),
+                response=response,
+            )
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from config.cache import get_version, weak_etag
+
+
+def conditional_get(get_state):
+    """
+    Условный GET (ETag / Last-Modified / 304) для DRF-вьюх.
+
+    get_state получает kwargs маршрута и возвращает список пар
+    (max(updated_at), count) по таблицам, из которых собирается ответ.
+    Состояние считается один раз на запрос и используется для обоих валидаторов,
+    поэтому 304 отдаётся без сериализации и без запросов за самими данными.
+
+    С config.cache.cached_response декоратор ставится внутри него: тогда
+    валидаторы считаются при сборке тела и хранятся вместе с ним, а не берутся
+    из текущего состояния базы для тела из кэша.
+    """
+
+    def state(request, *args, **kwargs):
+        if not hasattr(request, "_conditional_state"):
+            try:
+                request._conditional_state = get_state(**kwargs)
+            except Exception:
+                request._conditional_state = None
+        return request._conditional_state
+
+    def etag(request, *args, **kwargs):
+        current = state(request, *args, **kwargs)
+        if current is None:
+            return None
+        return weak_etag(current)
+
+    def last_modified(request, *args, **kwargs):
+        current = state(request, *args, **kwargs)
+        return max((latest for latest, total in current or () if latest), default=None)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def conditional_get_by_versions(*namespaces):
+    """
+    Условный GET по версиям пространств кэша (config.cache.get_version):
+    ETag меняется при каждом сбросе версии, и для 304 база не нужна вовсе.
+    Версия — счётчик, а не время, поэтому Last-Modified не отдаётся.
+    """
+
+    def etag(request, *args, **kwargs):
+        return weak_etag([get_version(namespace) for namespace in namespaces])
+
+    return condition(etag_func=etag)
+
+
+def cache_headers(name):
+    """Cache-Control для эндпоинта из settings.API_CACHE_CONTROL[name]."""
+    options = getattr(settings, "API_CACHE_CONTROL", {}).get(name)
+    if not options:
+        return lambda view: view
+    return cache_control(**options)
@@ -0,0 +1,42 @@
+import re
+import secrets
+
+from rest_framework.renderers import JSONRenderer
+
+
+class RawJSON:
+    """Уже закодированный JSON-фрагмент (UTF-8), который рендерер вставит как есть."""
+
+    __slots__ = ("content",)
+
+    def __init__(self, content):
+        self.content = content.encode() if isinstance(content, str) else content
+
+
+class FragmentJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer, который не перекодирует RawJSON: кодируется только обёртка
+    (пагинация и т. п.) с метками на месте фрагментов, затем метки заменяются
+    байтами фрагментов за один проход.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        fragments = []
+        token = secrets.token_hex(8)
+
+        def mark(value):
+            if isinstance(value, RawJSON):
+                fragments.append(value.content)
+                return f"@fragment:{token}:{len(fragments) - 1}@"
+            if isinstance(value, dict):
+                return {key: mark(item) for key, item in value.items()}
+            if isinstance(value, (list, tuple)):
+                return [mark(item) for item in value]
+            return value
+
+        marked = mark(data)
+        content = super().render(marked, accepted_media_type, renderer_context)
+        if not fragments:
+            return content
+        pattern = re.compile(rb'"@fragment:' + token.encode() + rb':(\d+)@"')
+        return pattern.sub(lambda match: fragments[int(match.group(1))], content)
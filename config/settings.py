@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os.path
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
@@ -155,6 +156,39 @@ DATABASES = {
     }
 }
 
+# SQLITE_PATH в окружении подменяет MySQL на SQLite — для локальной разработки и CI без MySQL,
+# например: SQLITE_PATH=db.sqlite3 python manage.py test. MySQL-специфичные индексы (FULLTEXT)
+# на SQLite пропускаются, полнотекстовый поиск работает через LIKE (GameRepository.search).
+
+if os.getenv('SQLITE_PATH'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH'),
+        }
+    }
+
+# Общий кэш для всех воркеров gunicorn. Без REDIS_URL (локально и в тестах) — память процесса.
+
+if os.getenv('REDIS_URL') and 'test' not in sys.argv:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': 'psgamezz',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'IGNORE_EXCEPTIONS': True,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -187,6 +221,65 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cache-Control для каталожных эндпоинтов, чтобы их мог кешировать обратный прокси
+
+API_CACHE_CONTROL = {
+    'all_games': {'public': True, 'max_age': 60},
+    'game_detail': {'public': True, 'max_age': 300},
+    'game_facets': {'public': True, 'max_age': 60},
+    'console_types': {'public': True, 'max_age': 3600},
+    'subscription_services': {'public': True, 'max_age': 300},
+}
+
+# Время жизни ответов в общем кэше (секунды). Ключи версионные: сигналы
+# на моделях каталога сдвигают версию, поэтому протухшие ответы просто не читаются.
+API_RESPONSE_CACHE_TIMEOUT = {
+    'all_games': 600,
+    'game_detail': 3600,
+    'console_types': 24 * 3600,
+    'subscription_services': 3600,
+}
+
+# Фильтры и сортировка AllGames по колоночному снимку каталога в памяти (нужен numpy).
+CATALOG_SNAPSHOT_ENABLED = True
+
+# Счётчики фасетов кэшируются по сигнатуре фильтров и версии каталога.
+GAME_FACETS_CACHE_TIMEOUT = 3600
+
+# Кэш первого уровня в памяти каждого воркера перед общим кэшем.
+LOCAL_CACHE_MAX_SIZE = 2000
+LOCAL_CACHE_TTL = 60
+
+# Как часто воркер сверяет версии ключей с общим кэшем (секунды) —
+# за это время инвалидация из другого воркера доходит до всех.
+CACHE_VERSION_POLL_INTERVAL = 1
+
+# Журнал изменений для индексов в памяти воркеров (config.cache.publish_change):
+# сколько хранится запись и на сколько версий воркер догоняет журнал без полной перезагрузки.
+CHANGE_LOG_TIMEOUT = 3600
+CHANGE_LOG_MAX = 1000
+
+# Устаревшая запись ещё CACHE_STALE_TTL секунд отдаётся, пока один воркер
+# пересобирает её (get_or_set — в фоне, ответы вьюх — в запросе этого воркера);
+# свежая обновляется за CACHE_REFRESH_AHEAD секунд до истечения.
+# Пустой ключ пересобирает один воркер (блокировка на CACHE_LOCK_TIMEOUT),
+# остальные ждут его до CACHE_LOCK_WAIT секунд.
+CACHE_STALE_TTL = 300
+CACHE_REFRESH_AHEAD = 30
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 3
+# В тестах данные живут в незакоммиченной транзакции, фоновый поток их не увидит.
+CACHE_REFRESH_IN_BACKGROUND = 'test' not in sys.argv
+
+# Импорт каталога из админки идёт в фоновом потоке; в тестах — синхронно.
+# Поток живёт в процессе веб-воркера, который принял загрузку: очереди задач нет,
+# и перезапуск воркера обрывает импорт. Задача, счётчики которой не обновлялись
+# IMPORT_JOB_STALE_AFTER секунд, считается оборванной и помечается ошибкой.
+IMPORT_JOBS_IN_BACKGROUND = 'test' not in sys.argv
+IMPORT_JOB_STALE_AFTER = 15 * 60
+# Сколько процессов разбирают строки импорта параллельно с записью; 0 или 1 — разбор в том же процессе.
+IMPORT_PARSE_WORKERS = 0 if 'test' in sys.argv else min(4, os.cpu_count() or 1)
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Token': {
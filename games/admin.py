@@ -1,14 +1,10 @@
-from datetime import datetime
-
 from django.contrib import admin, messages
-from django.http import HttpResponse
-from django.urls import path
-from django.shortcuts import render, redirect
-
-import openpyxl
-from decimal import Decimal
+from django.urls import path, reverse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.utils.html import format_html
 
-from .models import Game, Language, Categories, Faq, Publisher, Price, Image
+from .importer import ImportJobService
+from .models import Game, Language, Categories, Faq, Publisher, Price, Image, ImportJob
 from subscriptions.models import Consoles
 
 from django.utils.safestring import mark_safe
@@ -114,10 +110,16 @@ class GameAdmin(admin.ModelAdmin):
 
         return ", ".join(result)
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return GameRepository.search(queryset, search_term), False
+
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
-            path("import-excel/", self.import_excel, name="game-import-excel"),
+            path("import-excel/", self.admin_site.admin_view(self.import_excel), name="game-import-excel"),
+            path("import-jobs/<uuid:job_id>/", self.admin_site.admin_view(self.import_job), name="game-import-job"),
         ]
         return custom_urls + urls
 
@@ -125,143 +127,44 @@ class GameAdmin(admin.ModelAdmin):
     def import_excel(self, request):
 
         if request.method == "POST" and request.FILES.get("excel_file"):
-            excel_file = request.FILES["excel_file"]
             try:
-                wb = openpyxl.load_workbook(excel_file)
-                sheet = wb.active
-
-                for row in sheet.iter_rows(min_row=2, values_only=True):
-                    title = row[0]
-                    price_data = row[1]
-                    image_url = row[2]
-                    about = row[3]
-                    if not title or not price_data:
-                        continue
-
-
-                    parts = price_data.split("::")
-                    if len(parts) < 5:
-                        continue
-
-                    price1 = float(parts[0])
-                    price2 = parts[1]
-                    price2 = float(price2) if price2 else None
-                    price3 = float(parts[2])
-                    voice_text = parts[3]
-                    date_str = parts[4]
-
-                    voice_langs = []
-                    subtitle_langs = []
-
-                    if "|" in voice_text:
-                        languages = voice_text.split(" | ")
-                        for _ in languages:
-                            if " - " not in _:
-                                continue
-                            console, lang = _.split(" - ")
-                            lang_parts = lang.split("/")
-                            voice_lang = lang_parts[0].strip() if len(lang_parts) > 0 else None
-                            sub_lang = lang_parts[1].strip() if len(lang_parts) > 1 else None
-                            if voice_lang:
-                                voice_langs.append((console.strip(), voice_lang))
-                            if sub_lang:
-                                subtitle_langs.append((console.strip(), sub_lang))
-                    elif "/" in voice_text:
-                        voice, sub = voice_text.split("/")
-                        voice = voice.strip()
-                        sub = sub.strip()
-                        if price2 == 0:
-                            if voice:
-                                voice_langs.append(("PS5", voice))
-                            if sub:
-                                subtitle_langs.append(("PS5", sub))
-                        else:
-                            for console_name in ["PS4", "PS5"]:
-                                if voice:
-                                    voice_langs.append((console_name, voice))
-                                if sub:
-                                    subtitle_langs.append((console_name, sub))
-                    else:
-                        lang = voice_text.strip()
-                        if price2 == 0:
-                            voice_langs.append(("PS5", lang))
-                        else:
-                            for console_name in ["PS4", "PS5"]:
-                                voice_langs.append((console_name, lang))
-
-                    try:
-                        release_date = datetime.strptime(date_str.strip(), "%d.%m.%Y").date()
-                    except Exception:
-                        release_date = None
-
-                    game, created = Game.objects.get_or_create(
-                        title=title,
-                        defaults={
-                            'url_u': '/',
-                            'url_t': '/',
-                            'main_image_url': image_url or "https://example.com/default-image.jpg",
-                            'about': about,
-                            'is_available': True,
-                            'release_date': release_date
-                        }
-                    )
-                    if not created:
-                        game.url_u = '/'
-                        game.url_t = '/'
-                        game.main_image_url = image_url or "https://example.com/default-image.jpg"
-                        game.about = about
-                        game.is_available = True
-                        game.release_date = release_date
-                        game.save()
-
-
-                    for console_name, lang_name in voice_langs:
-                        code = "en" if lang_name.lower().startswith("англ") else "ru" if lang_name.lower().startswith(
-                            "рус") else lang_name[:2].lower()
-                        console, _ = Consoles.objects.get_or_create(name=console_name)
-                        lang_obj, _ = Language.objects.get_or_create(consoles=console, code=code, name=lang_name)
-                        game.voice_acting.add(lang_obj)
-
-                    for console_name, lang_name in subtitle_langs:
-                        code = "en" if lang_name.lower().startswith("англ") else "ru" if lang_name.lower().startswith(
-                            "рус") else lang_name[:2].lower()
-                        console, _ = Consoles.objects.get_or_create(name=console_name)
-                        lang_obj, _ = Language.objects.get_or_create(consoles=console, code=code, name=lang_name)
-                        game.subtitle.add(lang_obj) 
-                        
-
-                    if price2 == 0:
-                        ps5 = Consoles.objects.filter(name__icontains="PS5").first()
-                        if ps5:
-                            Price.objects.get_or_create(game=game, consoles=ps5, price=price1,
-                                                 payment_type="without_activation", is_active=True)
-                            Price.objects.get_or_create(game=game, consoles=ps5, price=price3,
-                                                 payment_type="with_activation", is_active=True)
-                    else:
-                        ps4 = Consoles.objects.filter(name__icontains="PS4").first()
-                        ps5 = Consoles.objects.filter(name__icontains="PS5").first()
-                        if ps4:
-                            Price.objects.get_or_create(game=game, consoles=ps4, price=price1,
-                                                 payment_type="without_activation", is_active=True)
-                            Price.objects.get_or_create(game=game, consoles=ps4, price=price2,
-                                                 payment_type="with_activation", is_active=True)
-                        if ps5:
-                            Price.objects.get_or_create(game=game, consoles=ps5, price=price1,
-                                                 payment_type="without_activation", is_active=True)
-                            Price.objects.get_or_create(game=game, consoles=ps5, price=price3,
-                                                 payment_type="with_activation", is_active=True)
-
-                return HttpResponse("""
-                    <script>
-                        alert('Импорт завершён успешно!');
-                        window.opener.location.reload(); 
-                        window.close(); 
-                    </script>
-                """)
+                job = ImportJobService.create(request.FILES["excel_file"], dry_run=bool(request.POST.get("dry_run")))
             except Exception as e:
                 messages.error(request, f"Ошибка при импорте: {e}")
-                print(e)
-            return redirect("..")
+                return redirect("..")
+            return redirect("admin:game-import-job", job_id=job.id)
 
         return render(request, "admin/import_excel.html")
 
+    def import_job(self, request, job_id):
+        ImportJobService.fail_stale()
+        job = get_object_or_404(ImportJob, id=job_id)
+        return render(request, "admin/import_job.html", {
+            **self.admin_site.each_context(request),
+            "job": job,
+            "title": "Импорт каталога",
+        })
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'created_at', 'file', 'status', 'dry_run', 'rows_processed',
+        'created_count', 'updated_count', 'unchanged_count', 'failed_count', 'progress',
+    ]
+    list_filter = ['status', 'dry_run']
+    readonly_fields = [field.name for field in ImportJob._meta.fields]
+
+    def changelist_view(self, request, extra_context=None):
+        ImportJobService.fail_stale()
+        return super().changelist_view(request, extra_context)
+
+    @admin.display(description="Прогресс")
+    def progress(self, obj):
+        return format_html('<a href="{}">Открыть</a>', reverse("admin:game-import-job", args=[obj.id]))
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
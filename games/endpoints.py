@@ -1,15 +1,19 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import GameDetail, AllGames
+from .views import GameDetail, AllGames, GameSuggest, GameFacets, GameBatch
 
 
 app_name = "games"
 
 urlpatterns = []
 
+# Маршруты коллекции идут раньше api/games/<game_id>; их имена зарезервированы от slug игр (Game.RESERVED_SLUGS).
 games_authorized_endpoints = [
     path("api/games/", AllGames.as_view(), name="all_games"),
+    path("api/games/suggest", GameSuggest.as_view(), name="game_suggest"),
+    path("api/games/facets", GameFacets.as_view(), name="game_facets"),
+    path("api/games/batch", GameBatch.as_view(), name="game_batch"),
     path("api/games/<str:game_id>", GameDetail.as_view(), name="game_detail"),
 ]
 
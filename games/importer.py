@@ -0,0 +1,336 @@
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import islice
+
+import openpyxl
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from config.cache import CATALOG, CATALOG_ROWS, FACETS, TITLES, bump_version, publish_change
+from subscriptions.models import Consoles
+
+from .models import Game, ImportJob, Language, Price
+from .parsing import CatalogRowParser, parse_chunk
+from .repository import GameRepository
+from .services import GameCardService
+from .slugs import SlugAllocator
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogImporter:
+    """
+    Потоковый импорт каталога из Excel. Лист читается в режиме read_only
+    построчно пачками по chunk_size; пачки разбираются в пуле из workers
+    процессов (games.parsing), а записывает их один этот процесс, каждую —
+    в своей транзакции: справочники берутся из словарей, игры и цены пишутся
+    bulk_create/bulk_update, связи M2M — пакетной вставкой в промежуточные таблицы.
+
+    Строки, хэш содержимого которых совпадает с Game.import_hash, не трогаются
+    вовсе. В режиме dry_run импортёр только сравнивает хэши и сообщает,
+    какие игры были бы созданы или обновлены.
+
+    bulk-операции не вызывают сигналы, поэтому после пачки импортёр сам
+    пересчитывает границы цен, сбрасывает карточки и версии кэша и публикует
+    изменённые игры в журналы CATALOG_ROWS и TITLES.
+    """
+
+    CHUNK_SIZE = 500
+    GAME_FIELDS = ("url_u", "url_t", "main_image_url", "about", "is_available", "release_date", "import_hash")
+    PRICE_FIELDS = ("price", "is_active", "effective_price", "updated_at")
+
+    def __init__(self, chunk_size=None, on_progress=None, dry_run=False, workers=None):
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+        self.workers = settings.IMPORT_PARSE_WORKERS if workers is None else workers
+        self.on_progress = on_progress
+        self.dry_run = dry_run
+        self.consoles = {}
+        self.languages = {}
+        self.stats = {
+            "processed": 0, "created": 0, "updated": 0, "unchanged": 0, "skipped": 0, "errors": [], "changes": [],
+        }
+
+    def load_references(self):
+        self.consoles = {console.name: console for console in Consoles.objects.all()}
+        self.languages = {
+            (language.consoles_id, language.code, language.name): language
+            for language in Language.objects.all()
+        }
+
+    def get_console(self, name):
+        console = self.consoles.get(name)
+        if console is None:
+            console = self.consoles[name] = Consoles.objects.create(name=name)
+        return console
+
+    def find_console(self, name):
+        """Консоль для цены: точное совпадение или первая, в названии которой есть name."""
+        if name in self.consoles:
+            return self.consoles[name]
+        lowered = name.lower()
+        return next((console for title, console in self.consoles.items() if lowered in title.lower()), None)
+
+    def get_languages(self, pairs):
+        keys = []
+        for console_name, name in pairs:
+            console = self.get_console(console_name)
+            keys.append((console.id, CatalogRowParser.language_code(name), name))
+        missing = {
+            key: Language(consoles_id=key[0], code=key[1], name=key[2])
+            for key in keys if key not in self.languages
+        }
+        if missing:
+            Language.objects.bulk_create(missing.values())
+            self.languages.update(missing)
+        return [self.languages[key] for key in keys]
+
+    def iter_rows(self, file):
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            yield from enumerate(workbook.active.iter_rows(min_row=2, values_only=True), start=2)
+        finally:
+            workbook.close()
+
+    def read_chunks(self, file):
+        rows = self.iter_rows(file)
+        while chunk := list(islice(rows, self.chunk_size)):
+            yield chunk
+
+    def parse_chunks(self, chunks):
+        """
+        Разобранные пачки по порядку. При workers > 1 разбор идёт в пуле процессов
+        на несколько пачек вперёд, пока вызывающий код пишет текущую.
+        """
+        if self.workers <= 1:
+            yield from map(parse_chunk, chunks)
+            return
+        # spawn: импорт может идти в фоновом потоке веб-воркера, fork из многопоточного процесса небезопасен.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.workers, mp_context=context) as executor:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(parse_chunk, chunk))
+                if len(pending) > self.workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def collect(self, records):
+        parsed = {}
+        for number, data, error in records:
+            if error is not None:
+                self.stats["errors"].append((number, error))
+            elif data is None:
+                self.stats["skipped"] += 1
+            else:
+                # Повтор названия в файле — побеждает последняя строка, как при построчном импорте.
+                parsed[data["title"]] = data
+        return parsed
+
+    def diff(self, games, parsed):
+        """Строки, которые нужно записать: новые игры и игры с изменившимся хэшем."""
+        changed = {}
+        for title, data in parsed.items():
+            game = games.get(title)
+            if game is not None and game.import_hash == data["import_hash"]:
+                self.stats["unchanged"] += 1
+                continue
+            changed[title] = data
+            self.stats["changes"].append((title, "update" if game is not None else "create"))
+        return changed
+
+    def save_games(self, games, parsed):
+        now = timezone.now()
+        created, updated = [], []
+        for title, data in parsed.items():
+            game = games.get(title)
+            if game is None:
+                game = games[title] = Game(title=title)
+                created.append(game)
+            else:
+                game.updated_at = now
+                updated.append(game)
+            game.url_u = game.url_t = "/"
+            game.main_image_url = data["main_image_url"]
+            game.about = data["about"]
+            game.is_available = True
+            game.release_date = data["release_date"]
+            game.import_hash = data["import_hash"]
+
+        SlugAllocator(Game, reserved=Game.RESERVED_SLUGS).bulk_create(created)
+        Game.objects.bulk_update(updated, [*self.GAME_FIELDS, "updated_at"])
+        self.stats["created"] += len(created)
+        self.stats["updated"] += len(updated)
+        return games
+
+    def save_prices(self, games, parsed):
+        existing = {
+            (price.game_id, price.consoles_id, price.payment_type): price
+            for price in Price.objects.filter(game__in=[games[title] for title in parsed])
+        }
+        now = timezone.now()
+        created, updated = {}, {}
+        for title, data in parsed.items():
+            game = games[title]
+            for console_name, payment_type, amount in data["prices"]:
+                console = self.find_console(console_name)
+                if console is None:
+                    continue
+                key = (game.id, console.id, payment_type)
+                price = existing.get(key)
+                if price is None:
+                    price = created[key] = created.get(key) or Price(
+                        game=game, consoles=console, payment_type=payment_type,
+                    )
+                else:
+                    price.updated_at = now
+                    updated[key] = price
+                price.price = amount
+                price.is_active = True
+                price.effective_price = price.discounted_price
+        Price.objects.bulk_create(created.values())
+        Price.objects.bulk_update(updated.values(), self.PRICE_FIELDS)
+
+    def save_languages(self, games, parsed):
+        for relation in ("voice_acting", "subtitle"):
+            through = getattr(Game, relation).through
+            links = {
+                (games[title].id, language.id)
+                for title, data in parsed.items()
+                for language in self.get_languages(data[relation])
+            }
+            through.objects.bulk_create(
+                [through(game_id=game_id, language_id=language_id) for game_id, language_id in links],
+                ignore_conflicts=True,
+            )
+
+    def import_chunk(self, records):
+        parsed = self.collect(records)
+        games = {game.title: game for game in Game.objects.filter(title__in=list(parsed))} if parsed else {}
+        parsed = self.diff(games, parsed)
+        if self.dry_run:
+            created = sum(title not in games for title in parsed)
+            self.stats["created"] += created
+            self.stats["updated"] += len(parsed) - created
+            return
+        if not parsed:
+            return
+        with transaction.atomic():
+            games = self.save_games(games, parsed)
+            self.save_languages(games, parsed)
+            self.save_prices(games, parsed)
+            game_ids = [games[title].id for title in parsed]
+            GameRepository.refresh_price_bounds(game_ids)
+            GameCardService.invalidate(game_ids)
+            bump_version(CATALOG, FACETS)
+            publish_change(CATALOG_ROWS, game_ids)
+            publish_change(TITLES, [(games[title].id, title, games[title].slug, True) for title in parsed])
+
+    def run(self, file):
+        self.load_references()
+        for records in self.parse_chunks(self.read_chunks(file)):
+            self.import_chunk(records)
+            self.stats["processed"] += len(records)
+            if self.on_progress is not None:
+                self.on_progress(self.stats)
+        return self.stats
+
+
+class ImportJobService:
+    """
+    Импорт каталога фоновой задачей: загруженный файл сохраняется в MEDIA_ROOT,
+    импорт идёт в отдельном потоке, а счётчики ImportJob обновляются после
+    каждой пачки — их показывает страница прогресса в админке.
+    Ошибок и изменённых игр в задаче хранится не больше MAX_ERRORS.
+
+    Поток — daemon в процессе воркера, принявшего загрузку: задача не переживает
+    перезапуск воркера и не подхватывается другим процессом. Такие задачи
+    fail_stale помечает ошибкой, когда их updated_at старше IMPORT_JOB_STALE_AFTER.
+
+    Загруженный файл удаляется, как только задача завершена (done или failed):
+    в ImportJob остаётся только его имя.
+    """
+
+    MAX_ERRORS = 200
+
+    @staticmethod
+    def create(uploaded_file, dry_run=False):
+        job = ImportJob.objects.create(file=uploaded_file, dry_run=dry_run)
+        transaction.on_commit(lambda: ImportJobService.start(job.id))
+        return job
+
+    @staticmethod
+    def start(job_id):
+        if settings.IMPORT_JOBS_IN_BACKGROUND:
+            threading.Thread(target=ImportJobService.run, args=(job_id,), daemon=True).start()
+        else:
+            ImportJobService.run(job_id)
+
+    @staticmethod
+    def progress_fields(stats):
+        return {
+            "rows_processed": stats["processed"],
+            "created_count": stats["created"],
+            "updated_count": stats["updated"],
+            "unchanged_count": stats["unchanged"],
+            "failed_count": len(stats["errors"]),
+            "errors": stats["errors"][:ImportJobService.MAX_ERRORS],
+            "changes": stats["changes"][:ImportJobService.MAX_ERRORS],
+        }
+
+    @staticmethod
+    def update(job_id, **fields):
+        ImportJob.objects.filter(id=job_id).update(updated_at=timezone.now(), **fields)
+
+    @staticmethod
+    def delete_file(job):
+        """Удаляет загруженный файл задачи из хранилища; имя в базе не меняется."""
+        if job.file:
+            job.file.delete(save=False)
+
+    @staticmethod
+    def fail_stale():
+        """Помечает ошибкой задачи, оборванные перезапуском воркера, и удаляет их файлы; возвращает их число."""
+        threshold = timezone.now() - timedelta(seconds=settings.IMPORT_JOB_STALE_AFTER)
+        jobs = ImportJob.objects.filter(status__in=("pending", "running"), updated_at__lt=threshold)
+        stale = list(jobs.only("id", "file"))
+        if not stale:
+            return 0
+        count = jobs.filter(id__in=[job.id for job in stale]).update(
+            status="failed",
+            message="Импорт прерван: воркер, выполнявший задачу, был перезапущен",
+            finished_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+        for job in stale:
+            ImportJobService.delete_file(job)
+        return count
+
+    @staticmethod
+    def run(job_id):
+        job = None
+        try:
+            job = ImportJob.objects.get(id=job_id)
+            ImportJobService.update(job_id, status="running", started_at=timezone.now())
+            importer = CatalogImporter(
+                on_progress=lambda stats: ImportJobService.update(job_id, **ImportJobService.progress_fields(stats)),
+                dry_run=job.dry_run,
+            )
+            with job.file.open("rb") as file:
+                stats = importer.run(file)
+            ImportJobService.update(
+                job_id, status="done", finished_at=timezone.now(), **ImportJobService.progress_fields(stats),
+            )
+        except Exception as e:
+            logger.exception("Импорт каталога %s завершился ошибкой", job_id)
+            ImportJobService.update(job_id, status="failed", message=str(e), finished_at=timezone.now())
+        finally:
+            if job is not None:
+                ImportJobService.delete_file(job)
+            if settings.IMPORT_JOBS_IN_BACKGROUND:
+                connections.close_all()
@@ -0,0 +1,639 @@
+import bisect
+import heapq
+import re
+import threading
+import uuid
+from collections import Counter
+
+from config.cache import CATALOG_ROWS, FACETS, TITLES, get_changes, get_version
+
+try:
+    import numpy as np
+except ImportError:  # без numpy AllGames фильтрует в базе
+    np = None
+
+from .repository import GameRepository
+
+
+class TitleChangesMixin:
+    """
+    Догоняет версию TITLES по журналу изменений (config.cache.publish_change):
+    изменение — список строк (id, title, slug, is_available), удалённая игра
+    приходит как (id, None, None, False). Целиком индекс перезагружается
+    только при первом обращении и когда журнал неполон.
+    """
+
+    def load_rows(self):
+        return GameRepository.get_title_rows()
+
+    def ensure_loaded(self):
+        version = get_version(TITLES)
+        if self._loaded and self._version == version:
+            return
+        changes = get_changes(TITLES, self._version, version) if self._loaded else None
+        if changes is None:
+            self.load(self.load_rows(), version)
+            return
+        with self._lock:
+            for change in changes:
+                self._apply(change)
+            self._version = max(self._version, version)
+
+    def apply(self, change):
+        with self._lock:
+            if self._loaded:
+                self._apply(change)
+
+
+class TitlePrefixIndex(TitleChangesMixin):
+    """
+    Префиксный индекс названий доступных игр для автодополнения.
+    Ключи (название целиком, slug и хвосты названия с начала каждого слова)
+    лежат в отсортированном списке, поиск — bisect по префиксу.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._games = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version = None
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(str(text).casefold().split())
+
+    def _keys_for(self, title, slug):
+        title_key = self.normalize(title)
+        words = title_key.split(" ")
+        keys = {" ".join(words[i:]) for i in range(len(words))}
+        if slug:
+            keys.add(slug)
+        keys.discard("")
+        return keys
+
+    def _add(self, game_id, title, slug):
+        self._remove(game_id)
+        keys = self._keys_for(title, slug)
+        for key in keys:
+            bisect.insort(self._keys, (key, game_id))
+        self._games[game_id] = {"keys": keys, "title": title, "slug": slug}
+
+    def _remove(self, game_id):
+        game = self._games.pop(game_id, None)
+        if game is None:
+            return
+        for key in game["keys"]:
+            position = bisect.bisect_left(self._keys, (key, game_id))
+            if position < len(self._keys) and self._keys[position] == (key, game_id):
+                del self._keys[position]
+
+    def load(self, rows, version=None):
+        version = get_version(TITLES) if version is None else version
+        with self._lock:
+            self._keys = []
+            self._games = {}
+            for game_id, title, slug in rows:
+                keys = self._keys_for(title, slug)
+                self._keys.extend((key, game_id) for key in keys)
+                self._games[game_id] = {"keys": keys, "title": title, "slug": slug}
+            self._keys.sort()
+            self._loaded = True
+            self._version = version
+
+    def _apply(self, change):
+        for game_id, title, slug, is_available in change:
+            if is_available:
+                self._add(game_id, title, slug)
+            else:
+                self._remove(game_id)
+
+    def add(self, game_id, title, slug):
+        with self._lock:
+            if self._loaded:
+                self._add(game_id, title, slug)
+
+    def remove(self, game_id):
+        with self._lock:
+            if self._loaded:
+                self._remove(game_id)
+
+    def suggest(self, query, limit=10):
+        self.ensure_loaded()
+        prefix = self.normalize(query)
+        if not prefix:
+            return []
+
+        with self._lock:
+            found = {}
+            position = bisect.bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(found) < limit * 4:
+                key, game_id = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                found.setdefault(game_id, self._games[game_id])
+                position += 1
+
+        ranked = sorted(
+            found.items(),
+            key=lambda item: (not self.normalize(item[1]["title"]).startswith(prefix), item[1]["title"].casefold()),
+        )
+        return [
+            {"id": game_id, "title": game["title"], "slug": game["slug"]}
+            for game_id, game in ranked[:limit]
+        ]
+
+
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh",
+    "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts",
+    "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu",
+    "я": "ya",
+}
+
+LATIN_SPELLING_VARIANTS = (
+    ("kh", "h"), ("ck", "k"), ("ph", "f"), ("q", "k"), ("w", "v"), ("x", "ks"), ("c", "k"), ("j", "dzh"),
+)
+
+
+def transliterate(text):
+    """
+    Приводит строку к латинскому «фонетическому» виду: кириллица
+    транслитерируется, а латинские варианты написания одного звука
+    сводятся к одному, чтобы «спайдер мэн» и «spider man» сблизились.
+    """
+    text = "".join(CYRILLIC_TO_LATIN.get(char, char) for char in str(text).casefold())
+    for variant, replacement in LATIN_SPELLING_VARIANTS:
+        text = text.replace(variant, replacement)
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def edit_distance(a, b, limit):
+    """Расстояние Левенштейна с отсечкой: всё, что больше limit, возвращается как limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class FuzzyTitleIndex(TitleChangesMixin):
+    """
+    Нечёткий поиск по названиям доступных игр: триграммный индекс по
+    транслитерированным названиям отбирает кандидатов (голосуют только самые
+    редкие триграммы запроса, точное пересечение считается уже для короткого
+    списка), затем они переранжируются по расстоянию Левенштейна между словами запроса
+    и словами названия. Внутри игры адресуются целыми порядковыми номерами:
+    хешировать int заметно дешевле, чем UUID.
+    """
+    candidates_limit = 50
+
+    def __init__(self):
+        self._postings = {}
+        self._games = {}
+        self._ordinals = {}
+        self._next_ordinal = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version = None
+
+    @staticmethod
+    def trigrams(normalized):
+        padded = f"  {normalized} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def _add(self, game_id, title):
+        self._remove(game_id)
+        normalized = transliterate(title)
+        grams = self.trigrams(normalized)
+        ordinal = self._next_ordinal
+        self._next_ordinal += 1
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(ordinal)
+        self._ordinals[game_id] = ordinal
+        self._games[ordinal] = {"id": game_id, "grams": grams, "words": normalized.split()}
+
+    def _remove(self, game_id):
+        ordinal = self._ordinals.pop(game_id, None)
+        if ordinal is None:
+            return
+        for gram in self._games.pop(ordinal)["grams"]:
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(ordinal)
+                if not postings:
+                    del self._postings[gram]
+
+    def load(self, rows, version=None):
+        version = get_version(TITLES) if version is None else version
+        with self._lock:
+            self._postings = {}
+            self._games = {}
+            self._ordinals = {}
+            self._next_ordinal = 0
+            for game_id, title, slug in rows:
+                self._add(game_id, title)
+            self._loaded = True
+            self._version = version
+
+    def _apply(self, change):
+        for game_id, title, slug, is_available in change:
+            if is_available:
+                self._add(game_id, title)
+            else:
+                self._remove(game_id)
+
+    def add(self, game_id, title):
+        with self._lock:
+            if self._loaded:
+                self._add(game_id, title)
+
+    def remove(self, game_id):
+        with self._lock:
+            if self._loaded:
+                self._remove(game_id)
+
+    @staticmethod
+    def word_distance(query_word, title_words):
+        limit = max(1, len(query_word) // 3)
+        best = limit + 1
+        for word in title_words:
+            best = min(
+                best,
+                edit_distance(query_word, word, limit),
+                edit_distance(query_word, word[:len(query_word)], limit),
+            )
+            if best == 0:
+                break
+        return best, limit
+
+    def search(self, query, limit=100):
+        """Возвращает id игр, отсортированные по убыванию релевантности."""
+        self.ensure_loaded()
+        normalized = transliterate(query)
+        query_words = normalized.split()
+        if not query_words:
+            return []
+
+        query_grams = self.trigrams(normalized)
+        with self._lock:
+            postings = sorted((self._postings[gram] for gram in query_grams if gram in self._postings), key=len)
+            hits = Counter()
+            for ordinals in postings[:len(postings) // 2 + 1]:
+                hits.update(ordinals)
+            shortlist = heapq.nlargest(self.candidates_limit * 4, hits.items(), key=lambda item: item[1])
+            candidates = heapq.nlargest(
+                self.candidates_limit,
+                ((self._games[ordinal], len(query_grams & self._games[ordinal]["grams"])) for ordinal, _ in shortlist),
+                key=lambda item: item[1],
+            )
+
+        ranked = []
+        for game, count in candidates:
+            total = 0
+            for query_word in query_words:
+                distance, word_limit = self.word_distance(query_word, game["words"])
+                if distance > word_limit:
+                    break
+                total += distance
+            else:
+                ranked.append((total, -count, len(game["words"]), str(game["id"]), game["id"]))
+        ranked.sort()
+        return [game_id for *_, game_id in ranked[:limit]]
+
+
+class SlugMap(TitleChangesMixin):
+    """
+    Процессный словарь slug → id игры для SEO-адресов (в том числе недоступных).
+    Загружается целиком при первом обращении, дальше обновляется по журналу TITLES.
+    Неизвестный slug (например, изменение ещё не дошло до журнала) ищется
+    в базе и запоминается.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._slugs = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version = None
+
+    def load(self, rows, version=None):
+        version = get_version(TITLES) if version is None else version
+        with self._lock:
+            self._ids = {slug: game_id for game_id, slug in rows}
+            self._slugs = {game_id: slug for slug, game_id in self._ids.items()}
+            self._loaded = True
+            self._version = version
+
+    def load_rows(self):
+        return GameRepository.get_slug_rows()
+
+    def _apply(self, change):
+        for game_id, title, slug, is_available in change:
+            self._set(game_id, slug)
+
+    def _set(self, game_id, slug):
+        old_slug = self._slugs.pop(game_id, None)
+        if old_slug is not None:
+            self._ids.pop(old_slug, None)
+        if slug:
+            self._ids[slug] = game_id
+            self._slugs[game_id] = slug
+
+    def set(self, game_id, slug):
+        with self._lock:
+            if self._loaded:
+                self._set(game_id, slug)
+
+    def remove(self, game_id):
+        self.set(game_id, None)
+
+    def forget(self, slug):
+        with self._lock:
+            game_id = self._ids.pop(slug, None)
+            if game_id is not None:
+                self._slugs.pop(game_id, None)
+
+    def resolve_many(self, slugs):
+        """{slug: id} для нескольких slug; неизвестные ищутся одним запросом."""
+        self.ensure_loaded()
+        with self._lock:
+            resolved = {slug: self._ids[slug] for slug in slugs if slug in self._ids}
+        missing = [slug for slug in slugs if slug not in resolved]
+        if missing:
+            for game_id, slug in GameRepository.get_slug_rows().filter(slug__in=missing):
+                self.set(game_id, slug)
+                resolved[slug] = game_id
+        return resolved
+
+    def resolve(self, slug):
+        self.ensure_loaded()
+        with self._lock:
+            game_id = self._ids.get(slug)
+        if game_id is None:
+            game_id = GameRepository.get_id_by_slug(slug)
+            if game_id is not None:
+                self.set(game_id, slug)
+        return game_id
+
+
+class FacetBitmapIndex:
+    """
+    Битовые индексы фасетов каталога. У каждой игры — порядковый номер,
+    у каждого значения фасета (категория, консоль с активной ценой, язык
+    озвучки, язык субтитров, издатель) — целое число Python, в котором
+    выставлены биты его игр. Фильтр — OR внутри фасета и AND между фасетами,
+    без цепочки M2M-джойнов и дублей строк.
+
+    Изменения связей M2M приходят через журнал FACETS (config.cache.publish_change)
+    как ("link" | "unlink", фасет, id игр, id значений) и правят биты на месте;
+    None вместо id — все игры или все значения. Остальные изменения (цены,
+    удаления, переименования) сдвигают версию без записи в журнале, и индекс
+    перезагружается целиком.
+    """
+
+    FACETS = ("category", "console", "publisher", "voice_acting", "subtitle")
+    # Категории и консоли в API фильтруются по названию, остальные — по id.
+    NAMED_FACETS = ("category", "console")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version = None
+        self._ordinals = {}
+        self._ids = []
+        self._bitmaps = {facet: {} for facet in self.FACETS}
+        self._names = {facet: {} for facet in self.NAMED_FACETS}
+
+    def _ordinal(self, game_id):
+        ordinal = self._ordinals.get(game_id)
+        if ordinal is None:
+            ordinal = self._ordinals[game_id] = len(self._ids)
+            self._ids.append(game_id)
+        return ordinal
+
+    def load(self, links, names, version=None):
+        version = get_version(FACETS) if version is None else version
+        with self._lock:
+            self._ordinals, self._ids = {}, []
+            self._bitmaps = {facet: {} for facet in self.FACETS}
+            for facet, rows in links.items():
+                bitmaps = self._bitmaps[facet]
+                for game_id, value_id in rows:
+                    bitmaps[value_id] = bitmaps.get(value_id, 0) | 1 << self._ordinal(game_id)
+            self._names = {facet: {} for facet in self.NAMED_FACETS}
+            for facet, rows in names.items():
+                for value_id, name in rows:
+                    self._names[facet].setdefault(name, []).append(value_id)
+            self._loaded = True
+            self._version = version
+
+    def ensure_loaded(self):
+        version = get_version(FACETS)
+        if self._loaded and self._version == version:
+            return
+        changes = get_changes(FACETS, self._version, version) if self._loaded else None
+        if changes is None:
+            self.load(*GameRepository.get_facet_rows(), version)
+            return
+        with self._lock:
+            for change in changes:
+                self._apply(change)
+            self._version = max(self._version, version)
+
+    def _link(self, facet, game_ids, value_ids):
+        bits = 0
+        for game_id in game_ids:
+            bits |= 1 << self._ordinal(game_id)
+        bitmaps = self._bitmaps[facet]
+        for value_id in value_ids:
+            bitmaps[value_id] = bitmaps.get(value_id, 0) | bits
+
+    def _unlink(self, facet, game_ids, value_ids):
+        bitmaps = self._bitmaps[facet]
+        if game_ids is None:
+            bits = -1
+        else:
+            bits = 0
+            for game_id in game_ids:
+                if game_id in self._ordinals:
+                    bits |= 1 << self._ordinals[game_id]
+        for value_id in list(bitmaps) if value_ids is None else value_ids:
+            if value_id in bitmaps:
+                bitmaps[value_id] &= ~bits
+
+    def _apply(self, change):
+        action, facet, game_ids, value_ids = change
+        if action == "link":
+            self._link(facet, game_ids, value_ids)
+        else:
+            self._unlink(facet, game_ids, value_ids)
+
+    def _resolve(self, facet, value):
+        value_ids = []
+        for token in value.split(","):
+            token = token.strip()
+            if not token:
+                continue
+            if facet in self._names and token in self._names[facet]:
+                value_ids.extend(self._names[facet][token])
+                continue
+            try:
+                value_ids.append(uuid.UUID(token))
+            except ValueError:
+                pass
+        return value_ids
+
+    def resolve(self, facet, value):
+        """id значений фасета по значению фильтра из запроса (названия или id через запятую)."""
+        self.ensure_loaded()
+        with self._lock:
+            return self._resolve(facet, value)
+
+    def _decode(self, bits):
+        ids = self._ids
+        return [ids[ordinal] for ordinal, bit in enumerate(reversed(bin(bits)[2:])) if bit == "1"]
+
+    def match(self, params):
+        """
+        id игр, подходящих под фасетные фильтры из params (значения через запятую).
+        None — фасетных фильтров в запросе нет.
+        """
+        facets = [(facet, params.get(facet)) for facet in self.FACETS if params.get(facet)]
+        if not facets:
+            return None
+        self.ensure_loaded()
+        with self._lock:
+            result = None
+            for facet, value in facets:
+                bitmaps = self._bitmaps[facet]
+                bits = 0
+                for value_id in self._resolve(facet, value):
+                    bits |= bitmaps.get(value_id, 0)
+                result = bits if result is None else result & bits
+            return self._decode(result)
+
+
+class CatalogSnapshot:
+    """
+    Колоночный снимок каталога в памяти воркера (NumPy): по строке на игру —
+    min_price, has_discount, is_available и release_date. Фасетные фильтры
+    приходят из facet_index, цена, скидка и сортировка считаются векторными
+    масками и lexsort, в базу идут только id страницы.
+
+    Снимок догоняет версию CATALOG_ROWS по журналу изменений
+    (config.cache.publish_change): записи журнала — id игр, чьи строки
+    поменялись; они перечитываются, исчезнувшие из базы — удаляются.
+    Если журнал неполон, снимок собирается заново.
+
+    Строка снимка хранит одну цену игры — минимальную по всем консолям,
+    поэтому фильтр по консоли вместе с ценой снимку не по силам: такой запрос
+    идёт в базу, где цена сравнивается с ценами выбранных консолей.
+    """
+
+    def __init__(self, facets):
+        self._facets = facets
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._games = {}
+
+    @property
+    def available(self):
+        return np is not None
+
+    @staticmethod
+    def _build(games):
+        ids = list(games)
+        values = [games[game_id] for game_id in ids]
+        return {
+            "ids": ids,
+            "rows": {game_id: position for position, game_id in enumerate(ids)},
+            "id_rank": np.argsort(np.argsort(np.array([game_id.hex for game_id in ids], dtype=object))),
+            "min_price": np.array([np.nan if row[0] is None else float(row[0]) for row in values], dtype=np.float64),
+            "has_discount": np.array([bool(row[1]) for row in values], dtype=bool),
+            "is_available": np.array([bool(row[2]) for row in values], dtype=bool),
+            "release_date": np.array([row[3].toordinal() if row[3] else 0 for row in values], dtype=np.int64),
+            "has_release_date": np.array([row[3] is not None for row in values], dtype=bool),
+        }
+
+    def refresh(self):
+        version = get_version(CATALOG_ROWS)
+        if self._data is not None and version == self._version:
+            return
+        with self._lock:
+            if self._data is not None and version == self._version:
+                return
+            changes = get_changes(CATALOG_ROWS, self._version, version) if self._data is not None else None
+            if changes is None:
+                self._games = {row[0]: row[1:] for row in GameRepository.get_snapshot_rows()}
+            else:
+                changed = set().union(*changes)
+                rows = {row[0]: row[1:] for row in GameRepository.get_snapshot_rows(changed)}
+                for game_id in changed:
+                    if game_id in rows:
+                        self._games[game_id] = rows[game_id]
+                    else:
+                        self._games.pop(game_id, None)
+            self._data = self._build(self._games)
+            self._version = version
+
+    def query(self, params, ordering):
+        """
+        id доступных игр по фильтрам AllGames в порядке ordering
+        (как GameCursorPagination.order_queryset). None — фильтр снимку не по силам.
+        """
+        if not self.available or params.get("title"):
+            return None
+        if params.get("console") and (params.get("min_price") or params.get("max_price")):
+            return None
+        self.refresh()
+        data = self._data
+
+        mask = data["is_available"].copy()
+        game_ids = self._facets.match(params)
+        if game_ids is not None:
+            rows = data["rows"]
+            facet_mask = np.zeros(len(mask), dtype=bool)
+            facet_mask[[rows[game_id] for game_id in game_ids if game_id in rows]] = True
+            mask &= facet_mask
+        with np.errstate(invalid="ignore"):
+            if params.get("min_price"):
+                mask &= data["min_price"] >= float(params["min_price"])
+            if params.get("max_price"):
+                mask &= data["min_price"] <= float(params["max_price"])
+        if params.get("has_discount") == "true":
+            mask &= data["has_discount"]
+
+        positions = np.flatnonzero(mask)
+        field_name = ordering.lstrip("-")
+        if field_name == "min_price":
+            values, present = data["min_price"], ~np.isnan(data["min_price"])
+            values = np.where(present, values, 0.0)
+        else:
+            values, present = data["release_date"], data["has_release_date"]
+        values, present = values[positions], present[positions]
+        if ordering.startswith("-"):
+            order = np.lexsort((data["id_rank"][positions], -values, ~present))
+        else:
+            order = np.lexsort((data["id_rank"][positions], values, present))
+        ids = data["ids"]
+        return [ids[position] for position in positions[order]]
+
+
+title_index = TitlePrefixIndex()
+fuzzy_index = FuzzyTitleIndex()
+slug_map = SlugMap()
+facet_index = FacetBitmapIndex()
+catalog_snapshot = CatalogSnapshot(facet_index)
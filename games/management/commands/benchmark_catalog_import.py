@@ -0,0 +1,85 @@
+import os
+import tempfile
+import time
+
+import openpyxl
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from games.importer import CatalogImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Импорт синтетического прайса: разбор в одном процессе против пула процессов "
+        "(записи должны совпасть) и, с --write, полный импорт в откатываемой транзакции"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000, help="Сколько строк в синтетическом файле")
+        parser.add_argument("--workers", type=int, default=max(settings.IMPORT_PARSE_WORKERS, 2),
+                            help="Сколько процессов разбирают строки")
+        parser.add_argument("--chunk-size", type=int, default=CatalogImporter.CHUNK_SIZE, help="Строк в пачке")
+        parser.add_argument("--write", action="store_true", help="Замерить и запись в базу (транзакция откатывается)")
+
+    @staticmethod
+    def build_workbook(path, rows):
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(["Название", "Цены", "Картинка", "Описание"])
+        for i in range(rows):
+            ps4_activation = 0 if i % 3 == 0 else 1500 + i % 700
+            if i % 2:
+                languages = "PS4 - Русский/Английский | PS5 - Русский/Русский"
+            else:
+                languages = "Английский/Русский"
+            sheet.append([
+                f"Benchmark Game {i}",
+                f"{1000 + i % 5000}::{ps4_activation}::{1800 + i % 900}::{languages}::{1 + i % 28:02d}.{1 + i % 12:02d}.2022",
+                f"https://example.com/benchmark/{i}.jpg",
+                f"Описание синтетической игры {i} " * 5,
+            ])
+        workbook.save(path)
+
+    def measure_parse(self, path, workers, chunk_size):
+        importer = CatalogImporter(chunk_size=chunk_size, workers=workers)
+        started = time.perf_counter()
+        records = [record for chunk in importer.parse_chunks(importer.read_chunks(path)) for record in chunk]
+        return records, time.perf_counter() - started
+
+    def measure_import(self, path, workers, chunk_size):
+        importer = CatalogImporter(chunk_size=chunk_size, workers=workers)
+        with transaction.atomic():
+            started = time.perf_counter()
+            stats = importer.run(path)
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return stats, elapsed
+
+    def handle(self, *args, **options):
+        rows, workers, chunk_size = options["rows"], options["workers"], options["chunk_size"]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "benchmark.xlsx")
+            started = time.perf_counter()
+            self.build_workbook(path, rows)
+            self.stdout.write(f"Файл на {rows} строк собран за {time.perf_counter() - started:.1f} с")
+
+            serial, serial_time = self.measure_parse(path, 1, chunk_size)
+            parallel, parallel_time = self.measure_parse(path, workers, chunk_size)
+            if serial != parallel:
+                raise CommandError("Записи пула процессов отличаются от разбора в одном процессе")
+            self.stdout.write(
+                f"Чтение и разбор, пачки по {chunk_size} — записи совпадают\n"
+                f"  1 процесс:   {serial_time:.2f} с\n"
+                f"  {workers} процесса: {parallel_time:.2f} с\n"
+                f"  ускорение:   x{serial_time / parallel_time:.1f}"
+            )
+
+            if options["write"]:
+                for label, count in (("1 процесс", 1), (f"{workers} процесса", workers)):
+                    stats, elapsed = self.measure_import(path, count, chunk_size)
+                    self.stdout.write(
+                        f"Полный импорт ({label}): {elapsed:.2f} с, "
+                        f"создано {stats['created']}, ошибок {len(stats['errors'])}"
+                    )
@@ -0,0 +1,83 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from games.indexes import FuzzyTitleIndex
+
+VOCABULARY = (
+    "spider", "man", "miles", "morales", "ghost", "tsushima", "gran", "turismo", "god", "war", "ragnarok",
+    "witcher", "wild", "hunt", "horizon", "zero", "dawn", "forbidden", "west", "call", "duty", "black", "ops",
+    "assassin", "creed", "valhalla", "mirage", "final", "fantasy", "resident", "evil", "village", "dead",
+    "space", "last", "us", "part", "red", "redemption", "far", "cry", "battlefield", "street", "fighter",
+    "mortal", "kombat", "need", "speed", "unbound", "hogwarts", "legacy", "elden", "ring", "dark", "souls",
+)
+CYRILLIC = {
+    "spider": "спайдер", "man": "мэн", "ghost": "гост", "witcher": "витчер", "horizon": "хорайзон",
+    "call": "колл", "god": "год", "war": "вар", "dead": "дэд", "space": "спейс", "elden": "элден", "ring": "ринг",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Нечёткий поиск по синтетическому каталогу: время загрузки индекса, "
+        "время запроса (медиана, p95, максимум) и доля запросов с опечатками, нашедших нужную игру"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--titles", type=int, default=20000, help="Сколько названий в индексе")
+        parser.add_argument("--queries", type=int, default=500, help="Сколько запросов выполнить")
+        parser.add_argument("--seed", type=int, default=1, help="Зерно генератора — для повторяемых замеров")
+
+    @staticmethod
+    def build_titles(rng, count):
+        titles = {}
+        while len(titles) < count:
+            words = rng.sample(VOCABULARY, rng.randint(2, 4))
+            if rng.random() < 0.3:
+                words.append(str(rng.randint(2, 9)))
+            titles.setdefault(" ".join(words).title(), uuid.uuid4())
+        return [(game_id, title, None) for title, game_id in titles.items()]
+
+    @staticmethod
+    def make_query(rng, title):
+        """Первые слова названия: с опечаткой в одном слове или кириллицей вместо латиницы."""
+        words = title.lower().split()[:2]
+        position = rng.randrange(len(words))
+        word = words[position]
+        if rng.random() < 0.5 and word in CYRILLIC:
+            words[position] = CYRILLIC[word]
+        elif len(word) > 3:
+            cut = rng.randrange(1, len(word))
+            words[position] = word[:cut] + word[cut + 1:]
+        return " ".join(words)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        rows = self.build_titles(rng, options["titles"])
+        index = FuzzyTitleIndex()
+        started = time.perf_counter()
+        index.load(rows, version=0)
+        load_time = time.perf_counter() - started
+        # Синтетический индекс не связан с базой: версия TITLES не проверяется.
+        index.ensure_loaded = lambda: None
+
+        timings, found = [], 0
+        for game_id, title, _ in rng.sample(rows, min(options["queries"], len(rows))):
+            query = self.make_query(rng, title)
+            started = time.perf_counter()
+            result = index.search(query, limit=10)
+            timings.append(time.perf_counter() - started)
+            found += game_id in result
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"Названий: {len(rows)}, загрузка индекса: {load_time:.2f} с\n"
+            f"Запросов: {len(timings)}, нужная игра в первых 10: {found / len(timings):.0%}\n"
+            f"  медиана: {statistics.median(timings) * 1000:.1f} мс\n"
+            f"  p95:     {p95 * 1000:.1f} мс\n"
+            f"  максимум: {timings[-1] * 1000:.1f} мс"
+        )
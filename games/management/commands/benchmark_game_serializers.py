@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+from games.repository import GameRepository
+from games.serializers import GameSerializer, GameDetailSerializer
+from games.services import GameCardService, GameValuesSerializer, PrefetchPlanner
+
+
+class Command(BaseCommand):
+    help = "Сравнивает GameSerializer и values()-сборку: одинаковый JSON, время и число запросов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=100, help="Сколько игр сериализовать за раз")
+        parser.add_argument("--repeat", type=int, default=5, help="Сколько раз повторить замер")
+
+    def run_serializer(self, game_ids, serializer_class):
+        games = GameRepository.get_by_ids(game_ids, PrefetchPlanner.plan(serializer_class))
+        return {game.id: GameCardService.encode(serializer_class(game).data) for game in games}
+
+    def run_values(self, game_ids, serializer_class):
+        return {
+            game_id: GameCardService.encode(data)
+            for game_id, data in GameValuesSerializer.serialize(game_ids, serializer_class).items()
+        }
+
+    def measure(self, engine, game_ids, serializer_class, repeat):
+        timings = []
+        for _ in range(repeat):
+            reset_queries()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                result = engine(game_ids, serializer_class)
+                timings.append(time.perf_counter() - started)
+        return result, min(timings), len(context.captured_queries)
+
+    def handle(self, *args, **options):
+        game_ids = list(GameRepository.get_available().order_by("id").values_list("id", flat=True)[:options["games"]])
+        if not game_ids:
+            raise CommandError("В базе нет доступных игр")
+
+        for serializer_class in (GameSerializer, GameDetailSerializer):
+            expected, serializer_time, serializer_queries = self.measure(
+                self.run_serializer, game_ids, serializer_class, options["repeat"])
+            actual, values_time, values_queries = self.measure(
+                self.run_values, game_ids, serializer_class, options["repeat"])
+
+            mismatched = [game_id for game_id in expected if expected[game_id] != actual.get(game_id)]
+            if mismatched or expected.keys() != actual.keys():
+                raise CommandError(f"{serializer_class.__name__}: JSON отличается для {len(mismatched)} игр, "
+                                   f"например {mismatched[:3]}")
+
+            self.stdout.write(
+                f"{serializer_class.__name__}, игр: {len(game_ids)} — JSON совпадает байт в байт\n"
+                f"  serializer: {serializer_time * 1000:.1f} мс, запросов: {serializer_queries}\n"
+                f"  values():   {values_time * 1000:.1f} мс, запросов: {values_queries}\n"
+                f"  ускорение:  x{serializer_time / values_time:.1f}"
+            )
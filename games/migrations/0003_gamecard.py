@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0002_alter_game_main_image_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameCard',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='games.game', verbose_name='Игра')),
+                ('list_json', models.TextField(verbose_name='Карточка для списка (JSON)')),
+                ('detail_json', models.TextField(verbose_name='Карточка для страницы игры (JSON)')),
+                ('source_updated_at', models.DateTimeField(verbose_name='Версия игры')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Карточка игры',
+                'verbose_name_plural': 'Карточки игр',
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:43
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Min, Q
+
+
+def fill_price_bounds(apps, schema_editor):
+    Game = apps.get_model('games', 'Game')
+    Price = apps.get_model('games', 'Price')
+
+    prices = list(Price.objects.all())
+    for price in prices:
+        if price.sale_amount is None:
+            price.effective_price = price.price
+        elif price.sale_unit == 'percent':
+            price.effective_price = price.price - (price.price * price.sale_amount) / 100
+        elif price.sale_unit == 'price':
+            price.effective_price = price.price - price.sale_amount
+        else:
+            price.effective_price = price.price
+    Price.objects.bulk_update(prices, ['effective_price'], batch_size=500)
+
+    bounds = (
+        Price.objects
+        .filter(is_active=True)
+        .values('game_id')
+        .annotate(
+            min_price=Min('effective_price'),
+            max_price=Max('effective_price'),
+            discounts=Count('id', filter=Q(effective_price__lt=F('price'))),
+        )
+    )
+    for row in bounds:
+        Game.objects.filter(id=row['game_id']).update(
+            min_price=row['min_price'],
+            max_price=row['max_price'],
+            has_discount=bool(row['discounts']),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0003_gamecard'),
+        ('subscriptions', '0004_remove_seometric_meta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='has_discount',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Есть скидка'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='max_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Максимальная цена со скидкой'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='min_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Минимальная цена со скидкой'),
+        ),
+        migrations.AddField(
+            model_name='price',
+            name='effective_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Цена со скидкой'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['is_available', 'min_price'], name='game_available_min_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['is_available', 'has_discount', 'min_price'], name='game_available_discount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='price',
+            index=models.Index(fields=['is_active', 'effective_price'], name='price_active_effective_idx'),
+        ),
+        migrations.RunPython(fill_price_bounds, migrations.RunPython.noop),
+    ]
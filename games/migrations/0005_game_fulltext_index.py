@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:44
+
+from django.db import migrations
+
+
+def add_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        "ALTER TABLE games_game ADD FULLTEXT INDEX game_title_about_ft (title, about)"
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute("ALTER TABLE games_game DROP INDEX game_title_about_ft")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0004_price_bounds'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
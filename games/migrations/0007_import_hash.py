@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0006_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='import_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Хэш строки последнего импорта'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='changes',
+            field=models.JSONField(blank=True, default=list, verbose_name='Изменённые игры'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='dry_run',
+            field=models.BooleanField(default=False, verbose_name='Пробный запуск (без записи)'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='unchanged_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Без изменений'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from games.slugs import SlugAllocator
+
+# Копия Game.RESERVED_SLUGS на момент миграции.
+RESERVED_SLUGS = ("suggest", "facets", "batch")
+
+
+def rename_reserved_slugs(apps, schema_editor):
+    Game = apps.get_model('games', 'Game')
+    games = list(Game.objects.filter(slug__in=RESERVED_SLUGS))
+    if not games:
+        return
+    for game in games:
+        game.slug = ""
+    SlugAllocator(Game, reserved=RESERVED_SLUGS).assign(games)
+    Game.objects.bulk_update(games, ['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0007_import_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_reserved_slugs, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,11 @@
 import uuid
 
-from django.utils.text import slugify
-
 from django.db import models
 
 from subscriptions.models import Consoles
 
+from .slugs import SlugAllocator
+
 
 class Game(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -41,19 +41,25 @@ class Game(models.Model):
     about = models.TextField(blank=True, null=True, verbose_name="Описание")
     is_available = models.BooleanField(default=True, verbose_name="Доступен")
     release_date = models.DateField(blank=True, null=True, verbose_name="Дата выпуска")
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False,
+                                    verbose_name="Минимальная цена со скидкой")
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False,
+                                    verbose_name="Максимальная цена со скидкой")
+    has_discount = models.BooleanField(default=False, editable=False, verbose_name="Есть скидка")
+    import_hash = models.CharField(max_length=64, blank=True, editable=False,
+                                   verbose_name="Хэш строки последнего импорта")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
 
+    # Маршруты коллекции под api/games/ (games/endpoints.py): игра с таким slug была бы ими перекрыта.
+    RESERVED_SLUGS = ("suggest", "facets", "batch")
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.title)
-            slug = base_slug
-            n = 1
-            while Game.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{n}"
-                n += 1
-            self.slug = slug
-        super().save(*args, **kwargs)
+        if self.slug in self.RESERVED_SLUGS:
+            self.slug = ""
+        if self.slug:
+            return super().save(*args, **kwargs)
+        SlugAllocator(Game, reserved=Game.RESERVED_SLUGS).save(self, lambda: super(Game, self).save(*args, **kwargs))
 
     def __str__(self):
         return f"{self.title}"
@@ -61,6 +67,10 @@ class Game(models.Model):
     class Meta:
         verbose_name = "Игра"
         verbose_name_plural = "Игры"
+        indexes = [
+            models.Index(fields=['is_available', 'min_price'], name='game_available_min_price_idx'),
+            models.Index(fields=['is_available', 'has_discount', 'min_price'], name='game_available_discount_idx'),
+        ]
 
 
 class Image(models.Model):
@@ -160,9 +170,18 @@ class Price(models.Model):
                                  verbose_name="Единица")
     sale_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
                                       verbose_name="Сума или Процент")
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False,
+                                          verbose_name="Цена со скидкой")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
-    
+
+    def save(self, *args, **kwargs):
+        self.effective_price = self.discounted_price
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'effective_price'}
+        super().save(*args, **kwargs)
+
     @property
     def discounted_price(self):
         if self.sale_amount is None:
@@ -184,4 +203,63 @@ class Price(models.Model):
         verbose_name = "Цена"
         verbose_name_plural = "Цены"
         unique_together = ('game', 'consoles', 'payment_type')
+        indexes = [
+            models.Index(fields=['is_active', 'effective_price'], name='price_active_effective_idx'),
+        ]
+
+
+
+class GameCard(models.Model):
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True,
+                                related_name='card', verbose_name="Игра")
+    list_json = models.TextField(verbose_name="Карточка для списка (JSON)")
+    detail_json = models.TextField(verbose_name="Карточка для страницы игры (JSON)")
+    # updated_at игры на момент чтения её строк: карточка, собранная до правки, с ним не совпадёт.
+    source_updated_at = models.DateTimeField(verbose_name="Версия игры")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    def __str__(self):
+        return f"{self.game_id}"
+
+    class Meta:
+        verbose_name = "Карточка игры"
+        verbose_name_plural = "Карточки игр"
+
+
+class ImportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Завершён'),
+        ('failed', 'Ошибка'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file = models.FileField(upload_to='imports/', verbose_name="Файл")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    dry_run = models.BooleanField(default=False, verbose_name="Пробный запуск (без записи)")
+    rows_processed = models.PositiveIntegerField(default=0, verbose_name="Обработано строк")
+    created_count = models.PositiveIntegerField(default=0, verbose_name="Создано игр")
+    updated_count = models.PositiveIntegerField(default=0, verbose_name="Обновлено игр")
+    unchanged_count = models.PositiveIntegerField(default=0, verbose_name="Без изменений")
+    failed_count = models.PositiveIntegerField(default=0, verbose_name="Строк с ошибками")
+    errors = models.JSONField(default=list, blank=True, verbose_name="Ошибки по строкам")
+    changes = models.JSONField(default=list, blank=True, verbose_name="Изменённые игры")
+    message = models.TextField(blank=True, verbose_name="Сообщение")
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name="Начат")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="Завершён")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
 
+    def __str__(self):
+        return f"{self.file.name} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Импорт каталога"
+        verbose_name_plural = "Импорты каталога"
+        ordering = ['-created_at']
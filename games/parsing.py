@@ -0,0 +1,133 @@
+import hashlib
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+DEFAULT_IMAGE_URL = "https://example.com/default-image.jpg"
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+class CatalogRowParser:
+    """
+    Разбор строки прайса поставщика: название, цены, картинка, описание.
+    Колонка цен — "цена::цена PS4 с активацией::цена PS5 с активацией::языки::дата".
+    Нулевая цена PS4 с активацией означает, что игра есть только на PS5;
+    пустая — что на PS4 игра продаётся только без активации.
+    """
+
+    @staticmethod
+    def language_code(name):
+        lowered = name.lower()
+        if lowered.startswith("англ"):
+            return "en"
+        if lowered.startswith("рус"):
+            return "ru"
+        return lowered[:2]
+
+    @staticmethod
+    def parse_languages(text, ps5_only):
+        voice, subtitles = [], []
+        consoles = ["PS5"] if ps5_only else ["PS4", "PS5"]
+        if "|" in text:
+            for part in text.split(" | "):
+                if " - " not in part:
+                    continue
+                console, languages = part.split(" - ", 1)
+                languages = [language.strip() for language in languages.split("/")]
+                if languages[0]:
+                    voice.append((console.strip(), languages[0]))
+                if len(languages) > 1 and languages[1]:
+                    subtitles.append((console.strip(), languages[1]))
+        elif "/" in text:
+            voice_name, subtitle_name = [language.strip() for language in text.split("/", 1)]
+            for console in consoles:
+                if voice_name:
+                    voice.append((console, voice_name))
+                if subtitle_name:
+                    subtitles.append((console, subtitle_name))
+        elif text.strip():
+            voice = [(console, text.strip()) for console in consoles]
+        return voice, subtitles
+
+    @staticmethod
+    def parse_price(value):
+        """Decimal; пустая ячейка — None, а не ноль."""
+        value = value.strip()
+        if not value:
+            return None
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            raise ImportRowError(f"некорректная цена {value!r}")
+
+    @classmethod
+    def parse(cls, row):
+        """Словарь с полями игры, ценами и языками; None — пустая строка."""
+        title, price_data, image_url, about = (list(row) + [None] * 4)[:4]
+        if not title or not price_data:
+            return None
+
+        parts = str(price_data).split("::")
+        if len(parts) < 5:
+            raise ImportRowError("в колонке цен меньше пяти полей")
+        price, ps4_activation, ps5_activation = (cls.parse_price(part) for part in parts[:3])
+        if price is None or ps5_activation is None:
+            raise ImportRowError("не указана цена без активации или цена PS5 с активацией")
+        ps5_only = ps4_activation == 0
+
+        try:
+            release_date = datetime.strptime(parts[4].strip(), "%d.%m.%Y").date()
+        except ValueError:
+            release_date = None
+
+        prices = [("PS5", "without_activation", price), ("PS5", "with_activation", ps5_activation)]
+        if not ps5_only:
+            ps4_prices = [("PS4", "without_activation", price)]
+            if ps4_activation is not None:
+                ps4_prices.append(("PS4", "with_activation", ps4_activation))
+            prices[:0] = ps4_prices
+
+        voice, subtitles = cls.parse_languages(parts[3], ps5_only)
+        data = {
+            "title": str(title).strip(),
+            "main_image_url": image_url or DEFAULT_IMAGE_URL,
+            "about": about,
+            "release_date": release_date,
+            "prices": prices,
+            "voice_acting": voice,
+            "subtitle": subtitles,
+        }
+        data["import_hash"] = cls.content_hash(data)
+        return data
+
+    @staticmethod
+    def content_hash(data):
+        """SHA-256 от разобранной строки: форматирование ячеек (пробелы, 1500 и 1500.00) на хэш не влияет."""
+        content = [
+            data["title"],
+            str(data["main_image_url"]).strip(),
+            str(data["about"] or "").strip(),
+            data["release_date"].isoformat() if data["release_date"] else "",
+            [(console, payment_type, str(amount.normalize())) for console, payment_type, amount in data["prices"]],
+            data["voice_acting"],
+            data["subtitle"],
+        ]
+        return hashlib.sha256(json.dumps(content, ensure_ascii=False).encode()).hexdigest()
+
+
+def parse_chunk(rows):
+    """
+    Разбирает пачку (номер строки, ячейки) в компактные записи
+    (номер, данные или None, текст ошибки или None). Вызывается в процессах
+    ProcessPoolExecutor, поэтому модуль не импортирует Django и не ходит в базу.
+    """
+    records = []
+    for number, row in rows:
+        try:
+            records.append((number, CatalogRowParser.parse(row), None))
+        except ImportRowError as e:
+            records.append((number, None, str(e)))
+    return records
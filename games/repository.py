@@ -1,39 +1,253 @@
-from .models import Game, Price
+import re
+
+from django.db import connection
+from django.db.models import (
+    CharField, Case, Count, Exists, F, FloatField, Func, Max, Min, OuterRef, Q, Subquery, Value, When,
+)
+from django.utils import timezone
+
+from subscriptions.models import Consoles
+from subscriptions.repository import get_tables_state
+
+from .models import Game, Price, GameCard, Image, Language, Categories, Publisher
+
+
+class BooleanModeMatch(Func):
+    """
+    MATCH (колонки) AGAINST (запрос IN BOOLEAN MODE) для FULLTEXT-индекса MySQL.
+    Колонки — выражения (F), поэтому в подзапросах Django подставляет им алиас таблицы (U0 и т. п.).
+    """
+
+    output_field = FloatField()
+
+    def __init__(self, *columns, query):
+        super().__init__(*columns, Value(query))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        *columns, query = self.get_source_expressions()
+        sql_parts, params = [], []
+        for column in columns:
+            column_sql, column_params = compiler.compile(column)
+            sql_parts.append(column_sql)
+            params.extend(column_params)
+        query_sql, query_params = compiler.compile(query)
+        return f"MATCH ({', '.join(sql_parts)}) AGAINST ({query_sql} IN BOOLEAN MODE)", [*params, *query_params]
+
 
 class GameRepository:
+    # Связи отдаются в порядке добавления — одинаково для prefetch и для values()-сборки.
+    RELATION_ORDERING = ('created_at', 'id')
+
     @staticmethod
-    def get_all_available():
+    def apply_plan(queryset, plan=None):
+        """Применяет план загрузки из PrefetchPlanner: only / select_related / prefetch_related."""
+        if plan is None:
+            return queryset
+        if plan['select_related']:
+            queryset = queryset.select_related(*plan['select_related'])
+        return queryset.prefetch_related(*plan['prefetch_related']).only(*plan['only'])
+
+    @staticmethod
+    def get_all_available(plan=None):
+        return GameRepository.apply_plan(Game.objects.filter(is_available=True), plan)
+
+    @staticmethod
+    def get_by_id(game_id, plan=None):
+        return GameRepository.apply_plan(Game.objects.filter(id=game_id), plan).first()
+
+    @staticmethod
+    def get_game_rows(game_ids, columns):
+        return Game.objects.filter(id__in=game_ids).values('id', *columns)
+
+    @staticmethod
+    def get_price_rows(game_ids):
         return (
-            Game.objects
-            .filter(is_available=True)
-            .select_related()
-            .prefetch_related(
-                'prices__consoles',
-                'categories',
-                'publishers',
-                'voice_acting',
-                'subtitle',
-                'images',
-                'faqs'
-            )
+            Price.objects
+            .filter(game_id__in=game_ids)
+            .order_by(*GameRepository.RELATION_ORDERING)
+            .values_list('game_id', 'id', 'consoles__name', 'price', 'sale_amount', 'payment_type', 'is_active')
         )
 
     @staticmethod
-    def get_by_id(game_id):
-        return (
-            Game.objects
-            .filter(id=game_id)
-            .select_related()
-            .prefetch_related(
-                'prices__consoles',
-                'categories',
-                'publishers',
-                'voice_acting',
-                'subtitle',
-                'images',
-                'faqs'
+    def get_relation_rows(relation, game_ids):
+        """(game_id, значения...) для M2M-связи игры или картинок — в том же порядке, что и prefetch."""
+        columns = {
+            'categories': ('categories', ('categories__category',)),
+            'publishers': ('publisher', ('publisher__publisher',)),
+            'voice_acting': ('language', ('language__code', 'language__consoles__name')),
+            'subtitle': ('language', ('language__code', 'language__consoles__name')),
+        }
+        if relation == 'images':
+            return (
+                Image.objects
+                .filter(game_id__in=game_ids)
+                .order_by(*GameRepository.RELATION_ORDERING)
+                .values_list('game_id', 'image_url')
             )
-            .first()
+        target, values = columns[relation]
+        return (
+            getattr(Game, relation).through.objects
+            .filter(game_id__in=game_ids)
+            .order_by(*[f'{target}__{field}' for field in GameRepository.RELATION_ORDERING])
+            .values_list('game_id', *values)
+        )
+
+    @staticmethod
+    def get_snapshot_rows(game_ids=None):
+        """Строки для колоночного снимка каталога: (id, min_price, has_discount, is_available, release_date)."""
+        games = Game.objects.all()
+        if game_ids is not None:
+            games = games.filter(id__in=game_ids)
+        return games.values_list('id', 'min_price', 'has_discount', 'is_available', 'release_date')
+
+    @staticmethod
+    def filter_by_console_price(queryset, console_ids, min_price=None, max_price=None):
+        """Игры с активной ценой на одной из консолей console_ids в диапазоне [min_price, max_price]."""
+        prices = Price.objects.filter(game=OuterRef('pk'), is_active=True, consoles_id__in=console_ids)
+        if min_price:
+            prices = prices.filter(effective_price__gte=min_price)
+        if max_price:
+            prices = prices.filter(effective_price__lte=max_price)
+        return queryset.filter(Exists(prices))
+
+    # Фильтр каталога → (M2M-поле Game, FK на значение в промежуточной таблице).
+    FACET_RELATIONS = {
+        'category': ('categories', 'categories'),
+        'publisher': ('publishers', 'publisher'),
+        'voice_acting': ('voice_acting', 'language'),
+        'subtitle': ('subtitle', 'language'),
+    }
+
+    @staticmethod
+    def get_facet_rows():
+        """
+        Связи игр со значениями фасетов — {фасет: [(game_id, id значения)]} —
+        и названия значений, по которым фильтруют категории и консоли.
+        """
+        links = {
+            facet: getattr(Game, relation).through.objects.values_list('game_id', f'{target}_id')
+            for facet, (relation, target) in GameRepository.FACET_RELATIONS.items()
+        }
+        links['console'] = Price.objects.filter(is_active=True).values_list('game_id', 'consoles_id').distinct()
+        names = {
+            'category': Categories.objects.values_list('id', 'category'),
+            'console': Consoles.objects.values_list('id', 'name'),
+        }
+        return links, names
+
+    @staticmethod
+    def get_updated_at(game_ids):
+        return dict(Game.objects.filter(id__in=game_ids).values_list('id', 'updated_at'))
+
+    @staticmethod
+    def touch(game_ids):
+        """Сдвигает updated_at игр, чтобы карточки, собранные до правки, перестали совпадать с ними."""
+        Game.objects.filter(id__in=list(game_ids)).update(updated_at=timezone.now())
+
+    @staticmethod
+    def get_available():
+        return Game.objects.filter(is_available=True)
+
+    @staticmethod
+    def get_title_rows():
+        return Game.objects.filter(is_available=True).values_list('id', 'title', 'slug')
+
+    @staticmethod
+    def get_slug_rows():
+        return Game.objects.values_list('id', 'slug')
+
+    @staticmethod
+    def get_id_by_slug(slug):
+        return Game.objects.filter(slug=slug).values_list('id', flat=True).first()
+
+    @staticmethod
+    def get_by_ids(game_ids, plan=None):
+        return GameRepository.apply_plan(Game.objects.filter(id__in=game_ids), plan)
+
+    @staticmethod
+    def search(queryset, query):
+        """
+        Полнотекстовый поиск по title и about с аннотацией relevance.
+        В MySQL работает через FULLTEXT-индекс game_title_about_ft,
+        в остальных СУБД (SQLite в тестах) — через эквивалентный LIKE-фолбэк.
+        """
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return queryset.annotate(relevance=Value(0.0, output_field=FloatField()))
+
+        if connection.vendor == 'mysql':
+            against = " ".join(f"+{term}*" for term in terms)
+            relevance = BooleanModeMatch(F('title'), F('about'), query=against)
+            return queryset.annotate(relevance=relevance).filter(relevance__gt=0)
+
+        condition = Q()
+        relevance = Value(0.0, output_field=FloatField())
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(about__icontains=term)
+            relevance += Case(When(title__icontains=term, then=Value(2.0)), default=Value(0.0),
+                              output_field=FloatField())
+            relevance += Case(When(about__icontains=term, then=Value(1.0)), default=Value(0.0),
+                              output_field=FloatField())
+        return queryset.filter(condition).annotate(relevance=relevance)
+
+    @staticmethod
+    def get_game_state(game_id):
+        return get_tables_state(
+            Game.objects.filter(id=game_id),
+            Price.objects.filter(game_id=game_id),
+            Image.objects.filter(game_id=game_id),
+            Language.objects.filter(Q(voice_acting_games=game_id) | Q(subtitle_games=game_id)),
+            Categories.objects.filter(category_games=game_id),
+            Publisher.objects.filter(publisher_game=game_id),
+            Consoles.objects.filter(price__game=game_id),
+        )
+
+    FACETS = (
+        ('categories', Game.categories.through.objects, 'game_id', 'categories_id', 'categories__category', None),
+        ('consoles', Price.objects.filter(is_active=True), 'game_id', 'consoles_id', 'consoles__name', None),
+        ('publishers', Game.publishers.through.objects, 'game_id', 'publisher_id', 'publisher__publisher', None),
+        ('voice_acting', Game.voice_acting.through.objects, 'game_id', 'language_id', 'language__name',
+         'language__consoles__name'),
+        ('subtitle', Game.subtitle.through.objects, 'game_id', 'language_id', 'language__name',
+         'language__consoles__name'),
+    )
+
+    @staticmethod
+    def get_facets(games):
+        """
+        Количество игр по категориям, консолям (активные цены), издателям и языкам
+        для отфильтрованного queryset игр — одним запросом UNION ALL.
+        """
+        game_ids = games.order_by().values('id')
+        facets = [
+            manager.filter(**{f'{game_field}__in': game_ids})
+            .order_by()
+            .values(facet=Value(position), value=F(value_field), label=F(label_field),
+                    console=F(console_field) if console_field else Value(None, output_field=CharField()))
+            .annotate(total=Count(game_field, distinct=True))
+            .values_list('facet', 'value', 'label', 'console', 'total')
+            for position, (name, manager, game_field, value_field, label_field, console_field)
+            in enumerate(GameRepository.FACETS)
+        ]
+        result = {name: [] for name, *_ in GameRepository.FACETS}
+        for position, value, label, console, total in facets[0].union(*facets[1:], all=True):
+            item = {"id": str(value), "name": label, "count": total}
+            if GameRepository.FACETS[position][5]:
+                item["console"] = console
+            result[GameRepository.FACETS[position][0]].append(item)
+        for items in result.values():
+            items.sort(key=lambda item: (-item["count"], item["name"] or ""))
+        return result
+
+    @staticmethod
+    def refresh_price_bounds(game_ids):
+        """Пересчитывает min_price/max_price/has_discount игр одним UPDATE с подзапросами."""
+        active = Price.objects.filter(game=OuterRef('pk'), is_active=True).order_by().values('game')
+        Game.objects.filter(id__in=list(game_ids)).update(
+            min_price=Subquery(active.annotate(value=Min('effective_price')).values('value')),
+            max_price=Subquery(active.annotate(value=Max('effective_price')).values('value')),
+            has_discount=Exists(active.filter(effective_price__lt=F('price'))),
+            updated_at=timezone.now(),
         )
 
     @staticmethod
@@ -46,6 +260,18 @@ class GameRepository:
 
 
 class PriceRepository:
+    @staticmethod
+    def get_prices_by_ids(price_ids):
+        try:
+            prices = (
+                Price.objects
+                .filter(id__in=price_ids, is_active=True)
+                .select_related('game', 'consoles')
+            )
+            return {str(price.id): price for price in prices}
+        except Exception as e:
+            return {}
+
     @staticmethod
     def get_price_by_id(price_id):
         try:
@@ -57,3 +283,27 @@ class PriceRepository:
             )
         except Exception as e:
             return None
+
+
+class GameCardRepository:
+    @staticmethod
+    def get_by_game_ids(game_ids):
+        """Только карточки, собранные из текущей версии игры; устаревшие считаются отсутствующими."""
+        return GameCard.objects.filter(game_id__in=game_ids, source_updated_at=F('game__updated_at'))
+
+    @staticmethod
+    def bulk_save(cards):
+        # Устаревшая карточка перезаписывается; MySQL не принимает unique_fields и берёт конфликт по ключу.
+        unique_fields = ['game'] if connection.features.supports_update_conflicts_with_target else None
+        GameCard.objects.bulk_create(
+            cards, update_conflicts=True, unique_fields=unique_fields,
+            update_fields=['list_json', 'detail_json', 'source_updated_at', 'updated_at'],
+        )
+
+    @staticmethod
+    def delete_by_game_ids(game_ids):
+        return GameCard.objects.filter(game_id__in=game_ids).delete()
+
+    @staticmethod
+    def delete_by_filter(**lookups):
+        return GameCard.objects.filter(**lookups).delete()
@@ -4,7 +4,18 @@ from .models import (Game)
 from .services import GameService
 
 
-class GameSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Ограничивает вывод сериализатора: GameSerializer(game, fields=[...], exclude=[...])."""
+
+    def __init__(self, *args, fields=None, exclude=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = GameService.select_fields(list(self.fields), fields, exclude)
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+
+class GameSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     consoles = serializers.SerializerMethodField()
     categories = serializers.SerializerMethodField()
     publishers = serializers.SerializerMethodField()
@@ -43,7 +54,7 @@ class GameSerializer(serializers.ModelSerializer):
         return GameService.get_subtitle(obj)
 
 
-class GameDetailSerializer(serializers.ModelSerializer):
+class GameDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     consoles = serializers.SerializerMethodField()
     voice_acting = serializers.SerializerMethodField()
     subtitle = serializers.SerializerMethodField()
@@ -1,8 +1,29 @@
+import json
 from collections import defaultdict
 
-from .repository import GameRepository, PriceRepository
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Prefetch
+from rest_framework.utils.encoders import JSONEncoder
 
-from .models import Price, Game
+from config.renderers import RawJSON
+
+from .repository import GameRepository, PriceRepository, GameCardRepository
+
+from .models import Price, Game, GameCard
+
+
+def uses(*paths):
+    """
+    Объявляет, какие поля связей читает метод GameService (в нотации lookup:
+    "prices__consoles__name"). По этим объявлениям PrefetchPlanner строит
+    select_related/prefetch_related/only для сериализаторов.
+    """
+
+    def decorator(func):
+        func.uses = paths
+        return func
+
+    return decorator
 
 
 class GameService:
@@ -10,12 +31,35 @@ class GameService:
         self.repository = repository
 
     def list_available_games(self):
-        return self.repository.get_all_available()
+        from .serializers import GameSerializer
+
+        return self.repository.get_all_available(PrefetchPlanner.plan(GameSerializer))
 
     def get_game_detail(self, game_id):
-        return self.repository.get_by_id(game_id)
+        from .serializers import GameDetailSerializer
+
+        return self.repository.get_by_id(game_id, PrefetchPlanner.plan(GameDetailSerializer))
 
     @staticmethod
+    def parse_fields(value):
+        if not value:
+            return None
+        return [name.strip() for name in value.split(",") if name.strip()]
+
+    @staticmethod
+    def select_fields(available, fields=None, exclude=None):
+        """
+        Поля сериализатора, оставшиеся после ?fields= / ?exclude=, в исходном порядке.
+        None — ограничений нет. Неизвестные имена игнорируются, id отдаётся всегда.
+        """
+        if not fields and not exclude:
+            return None
+        selected = [name for name in available if not fields or name in fields or name == "id"]
+        return [name for name in selected if name not in (exclude or ()) or name == "id"]
+
+    @staticmethod
+    @uses("prices__id", "prices__price", "prices__sale_amount", "prices__payment_type", "prices__is_active",
+          "prices__consoles__name")
     def get_prices(game):
         return {
             "with_activation": [
@@ -31,18 +75,22 @@ class GameService:
         }
 
     @staticmethod
+    @uses("prices__is_active", "prices__consoles__name")
     def get_consoles(game):
         return {c.consoles.name for c in game.prices.all() if c.is_active}
 
     @staticmethod
+    @uses("categories__category")
     def get_categories(game):
         return [cat.category for cat in game.categories.all()]
 
     @staticmethod
+    @uses("publishers__publisher")
     def get_publishers(game):
         return [pub.publisher for pub in game.publishers.all()]
 
     @staticmethod
+    @uses("voice_acting__code", "voice_acting__consoles__name")
     def get_voice_acting(game):
         result = defaultdict(list)
         for lang in game.voice_acting.all():
@@ -51,6 +99,7 @@ class GameService:
         return dict(result)
 
     @staticmethod
+    @uses("subtitle__code", "subtitle__consoles__name")
     def get_subtitle(game):
         result = defaultdict(list)
         for lang in game.subtitle.all():
@@ -59,16 +108,261 @@ class GameService:
         return dict(result)
 
     @staticmethod
+    @uses("images__image_url")
     def get_images(game):
         return {image.image_url for image in game.images.all()}
 
 
+class PrefetchPlanner:
+    """
+    Минимальный план загрузки игр для сериализатора: обычные поля модели идут
+    в only(), SerializerMethodField — через объявления @uses в GameService.
+    Прямые FK превращаются в select_related, обратные FK и M2M — в
+    Prefetch(queryset=...only()) со своими select_related внутри.
+    """
+
+    @staticmethod
+    def get_paths(serializer_class, fields=None):
+        paths = []
+        for name, field in serializer_class(fields=fields).fields.items():
+            method_name = getattr(field, "method_name", None)
+            if method_name is None:
+                paths.append(field.source)
+                continue
+            accessor = getattr(GameService, method_name, None)
+            if not hasattr(accessor, "uses"):
+                raise ImproperlyConfigured(
+                    f"{serializer_class.__name__}.{name}: у GameService.{method_name} нет объявления @uses"
+                )
+            paths.extend(accessor.uses)
+        return paths
+
+    @staticmethod
+    def new_node(model):
+        return {"model": model, "only": {model._meta.pk.name}, "select": {}, "prefetch": {}}
+
+    @staticmethod
+    def add_path(node, parts):
+        field = node["model"]._meta.get_field(parts[0])
+        if not field.is_relation:
+            node["only"].add(field.name)
+            return
+        if field.concrete and not field.many_to_many:
+            node["only"].add(field.name)
+            branch = node["select"]
+        else:
+            branch = node["prefetch"]
+        child = branch.setdefault(field.name, PrefetchPlanner.new_node(field.related_model))
+        if field.one_to_many:
+            child["only"].add(field.field.name)
+        if len(parts) > 1:
+            PrefetchPlanner.add_path(child, parts[1:])
+
+    @staticmethod
+    def compile(node, prefix=""):
+        only = [prefix + name for name in sorted(node["only"])]
+        select_related, prefetch_related = [], []
+        for name, child in node["select"].items():
+            select_related.append(prefix + name)
+            child_only, child_select, child_prefetch = PrefetchPlanner.compile(child, f"{prefix}{name}__")
+            only += child_only
+            select_related += child_select
+            prefetch_related += child_prefetch
+        for name, child in node["prefetch"].items():
+            child_only, child_select, child_prefetch = PrefetchPlanner.compile(child)
+            queryset = child["model"].objects.all()
+            if child_select:
+                queryset = queryset.select_related(*child_select)
+            ordering = [name for name in GameRepository.RELATION_ORDERING
+                        if any(field.name == name for field in child["model"]._meta.fields)]
+            queryset = queryset.prefetch_related(*child_prefetch).only(*child_only).order_by(*ordering)
+            prefetch_related.append(Prefetch(prefix + name, queryset=queryset))
+        return only, select_related, prefetch_related
+
+    @staticmethod
+    def plan(serializer_class, fields=None):
+        root = PrefetchPlanner.new_node(Game)
+        for path in PrefetchPlanner.get_paths(serializer_class, fields):
+            PrefetchPlanner.add_path(root, path.split("__"))
+        only, select_related, prefetch_related = PrefetchPlanner.compile(root)
+        return {"only": only, "select_related": select_related, "prefetch_related": prefetch_related}
+
+
+class GameValuesSerializer:
+    """
+    Быстрая сборка ответа GameSerializer/GameDetailSerializer из values():
+    по одному запросу на связь для всей страницы, без экземпляров моделей.
+    Результат совпадает с сериализатором байт в байт (см. benchmark_game_serializers),
+    поэтому наборы (consoles, images) собираются в том же порядке вставки.
+    """
+
+    RELATIONS = ('categories', 'publishers', 'voice_acting', 'subtitle', 'images')
+
+    @staticmethod
+    def serialize(game_ids, serializer_class, fields=None):
+        serializer_fields = serializer_class(fields=fields).fields
+        concrete = {field.attname for field in Game._meta.concrete_fields}
+        columns = [name for name in serializer_fields if name in concrete and name != 'id']
+        rows = {row['id']: row for row in GameRepository.get_game_rows(game_ids, columns)}
+
+        related = {name: defaultdict(list) for name in ('prices', *GameValuesSerializer.RELATIONS)}
+        if 'prices' in serializer_fields or 'consoles' in serializer_fields:
+            for game_id, *price in GameRepository.get_price_rows(rows):
+                related['prices'][game_id].append(price)
+        for relation in GameValuesSerializer.RELATIONS:
+            if relation in serializer_fields:
+                for game_id, *values in GameRepository.get_relation_rows(relation, rows):
+                    related[relation][game_id].append(values)
+
+        result = {}
+        for game_id, row in rows.items():
+            data = {}
+            for name, field in serializer_fields.items():
+                if name in row:
+                    value = row[name]
+                    data[name] = None if value is None else field.to_representation(value)
+                elif name == 'prices':
+                    data[name] = GameValuesSerializer.get_prices(related['prices'][game_id])
+                elif name == 'consoles':
+                    data[name] = {console for _, console, _, _, _, is_active in related['prices'][game_id] if is_active}
+                elif name in ('voice_acting', 'subtitle'):
+                    data[name] = GameValuesSerializer.get_languages(related[name][game_id])
+                elif name == 'images':
+                    data[name] = {image_url for image_url, in related['images'][game_id]}
+                else:
+                    data[name] = [value for value, in related[name][game_id]]
+            result[game_id] = data
+        return result
+
+    @staticmethod
+    def get_prices(prices):
+        return {
+            payment_type: [
+                {"id": price_id, console: price, "sale_amount": sale_amount if sale_amount else 0}
+                for price_id, console, price, sale_amount, row_payment_type, is_active in prices
+                if row_payment_type == payment_type and is_active
+            ]
+            for payment_type in ("with_activation", "without_activation")
+        }
+
+    @staticmethod
+    def get_languages(languages):
+        result = defaultdict(list)
+        for code, console_name in languages:
+            result[console_name if console_name else "unknown"].append(code)
+        return dict(result)
+
+
+class GameCardService:
+    """
+    Материализованные карточки игр: ответы GameSerializer/GameDetailSerializer
+    хранятся в GameCard уже закодированными в JSON и пересобираются только
+    после того, как сигналы удалили устаревшую карточку.
+
+    Удаление идёт в транзакции пишущего, и параллельный читатель может успеть
+    собрать карточку из строк до коммита и сохранить её уже после удаления.
+    Поэтому карточка помнит updated_at игры, прочитанный до её строк, а invalidate
+    сдвигает updated_at: такая карточка при чтении не совпадёт с игрой и будет пересобрана.
+    """
+
+    @staticmethod
+    def encode(data):
+        # Тот же вывод, что у JSONRenderer: карточки вставляются в ответ без перекодирования.
+        content = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+        return content.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+
+    @staticmethod
+    def build_cards(game_ids):
+        from .serializers import GameSerializer, GameDetailSerializer
+
+        # Версия читается до строк игры: правка, закоммиченная между ними, даст карточке старую версию.
+        versions = GameRepository.get_updated_at(game_ids)
+        cards = {}
+        for game_id, data in GameValuesSerializer.serialize(list(versions), GameSerializer).items():
+            detail = {name: data[name] for name in GameDetailSerializer.Meta.fields}
+            cards[game_id] = GameCard(
+                game_id=game_id,
+                list_json=GameCardService.encode(data),
+                detail_json=GameCardService.encode(detail),
+                source_updated_at=versions[game_id],
+            )
+        GameCardRepository.bulk_save(list(cards.values()))
+        return cards
+
+    @staticmethod
+    def get_cards(game_ids):
+        cards = {card.game_id: card for card in GameCardRepository.get_by_game_ids(game_ids)}
+        missing = [game_id for game_id in game_ids if game_id not in cards]
+        if missing:
+            cards.update(GameCardService.build_cards(missing))
+        return cards
+
+    @staticmethod
+    def build_payloads(game_ids, serializer_class, fields):
+        """Собирает только выбранные поля, без записи карточек: запросы только к нужным связям."""
+        return GameValuesSerializer.serialize(game_ids, serializer_class, fields)
+
+    @staticmethod
+    def trim(payload, fields):
+        return {name: value for name, value in payload.items() if name in fields}
+
+    @staticmethod
+    def get_list_payloads(game_ids, fields=None):
+        if fields is None:
+            cards = GameCardService.get_cards(game_ids)
+            return [RawJSON(cards[game_id].list_json) for game_id in game_ids if game_id in cards]
+
+        from .serializers import GameSerializer
+
+        payloads = {
+            card.game_id: GameCardService.trim(json.loads(card.list_json), fields)
+            for card in GameCardRepository.get_by_game_ids(game_ids)
+        }
+        missing = [game_id for game_id in game_ids if game_id not in payloads]
+        if missing:
+            payloads.update(GameCardService.build_payloads(missing, GameSerializer, fields))
+        return [payloads[game_id] for game_id in game_ids if game_id in payloads]
+
+    @staticmethod
+    def get_detail_payloads(game_ids, fields=None):
+        payloads = {}
+        for card in GameCardRepository.get_by_game_ids(game_ids):
+            payload = json.loads(card.detail_json)
+            payloads[card.game_id] = payload if fields is None else GameCardService.trim(payload, fields)
+        missing = [game_id for game_id in game_ids if game_id not in payloads]
+        if missing and fields is None:
+            for game_id, card in GameCardService.build_cards(missing).items():
+                payloads[game_id] = json.loads(card.detail_json)
+        elif missing:
+            from .serializers import GameDetailSerializer
+
+            payloads.update(GameCardService.build_payloads(missing, GameDetailSerializer, fields))
+        return payloads
+
+    @staticmethod
+    def get_detail_payload(game_id, fields=None):
+        return GameCardService.get_detail_payloads([game_id], fields).get(game_id)
+
+    @staticmethod
+    def invalidate(game_ids):
+        game_ids = list(game_ids)
+        GameRepository.touch(game_ids)
+        GameCardRepository.delete_by_game_ids(game_ids)
+
+
 class GamePurchaseService:
     @staticmethod
-    def prepare_game_purchase_items(game_data):
+    def load_prices(games_data):
+        return PriceRepository.get_prices_by_ids([game_data['price_id'] for game_data in games_data])
+
+    @staticmethod
+    def prepare_game_purchase_items(game_data, prices=None):
 
         try:
-            price = PriceRepository.get_price_by_id(game_data['price_id'])
+            if prices is not None:
+                price = prices.get(str(game_data['price_id']))
+            else:
+                price = PriceRepository.get_price_by_id(game_data['price_id'])
             if price is None:
                 raise Price.DoesNotExist("Цена не найдена или неактивна")
 
@@ -0,0 +1,147 @@
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from config.cache import CATALOG, CATALOG_ROWS, FACETS, TITLES, bump_version, publish_change
+from subscriptions.models import Consoles
+
+from .models import Game, Price, Image, Language, Categories, Publisher
+from .indexes import title_index, fuzzy_index, slug_map
+from .repository import GameRepository
+from .services import GameCardService
+
+
+@receiver(post_save, sender=Game)
+def invalidate_game_card(sender, instance, created, **kwargs):
+    if not created:
+        GameCardService.invalidate([instance.pk])
+
+
+def apply_title_change(change):
+    """Сразу правит индексы названий этого воркера, остальные догонят изменение по журналу TITLES."""
+    for index in (title_index, fuzzy_index, slug_map):
+        index.apply(change)
+    publish_change(TITLES, change)
+
+
+@receiver(post_save, sender=Game)
+def update_title_indexes(sender, instance, **kwargs):
+    apply_title_change([(instance.pk, instance.title, instance.slug, instance.is_available)])
+
+
+@receiver(post_delete, sender=Game)
+def remove_from_title_indexes(sender, instance, **kwargs):
+    apply_title_change([(instance.pk, None, None, False)])
+
+
+@receiver([post_save, post_delete], sender=Price)
+def refresh_game_price_bounds(sender, instance, **kwargs):
+    GameRepository.refresh_price_bounds([instance.game_id])
+
+
+@receiver([post_save, post_delete], sender=Game)
+def publish_catalog_row_change(sender, instance, **kwargs):
+    publish_change(CATALOG_ROWS, [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Price)
+def publish_catalog_row_change_by_price(sender, instance, **kwargs):
+    # Цена меняет min_price и has_discount игры — её строку в снимке каталога.
+    publish_change(CATALOG_ROWS, [instance.game_id])
+
+
+@receiver([post_save, post_delete], sender=Price)
+@receiver([post_save, post_delete], sender=Image)
+def invalidate_game_card_by_child(sender, instance, **kwargs):
+    GameCardService.invalidate([instance.game_id])
+
+
+@receiver([post_save, pre_delete], sender=Language)
+def invalidate_game_cards_by_language(sender, instance, **kwargs):
+    game_ids = Game.objects.filter(Q(voice_acting=instance) | Q(subtitle=instance)).values_list('id', flat=True)
+    GameCardService.invalidate(set(game_ids))
+
+
+@receiver([post_save, pre_delete], sender=Categories)
+def invalidate_game_cards_by_category(sender, instance, **kwargs):
+    GameCardService.invalidate(instance.category_games.values_list('id', flat=True))
+
+
+@receiver([post_save, pre_delete], sender=Publisher)
+def invalidate_game_cards_by_publisher(sender, instance, **kwargs):
+    GameCardService.invalidate(instance.publisher_game.values_list('id', flat=True))
+
+
+@receiver([post_save, pre_delete], sender=Consoles)
+def invalidate_game_cards_by_console(sender, instance, **kwargs):
+    game_ids = Game.objects.filter(
+        Q(prices__consoles=instance) | Q(voice_acting__consoles=instance) | Q(subtitle__consoles=instance)
+    ).values_list('id', flat=True)
+    GameCardService.invalidate(set(game_ids))
+
+
+@receiver(m2m_changed, sender=Game.voice_acting.through)
+@receiver(m2m_changed, sender=Game.subtitle.through)
+@receiver(m2m_changed, sender=Game.categories.through)
+@receiver(m2m_changed, sender=Game.publishers.through)
+def invalidate_game_cards_by_relation(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        game_ids = [instance.pk]
+    elif action == 'pre_clear':
+        links = sender.objects.filter(**{instance._meta.model_name: instance})
+        game_ids = list(links.values_list('game_id', flat=True))
+    else:
+        game_ids = list(pk_set)
+    GameCardService.invalidate(game_ids)
+
+
+@receiver(m2m_changed, sender=Game.voice_acting.through)
+@receiver(m2m_changed, sender=Game.subtitle.through)
+@receiver(m2m_changed, sender=Game.categories.through)
+@receiver(m2m_changed, sender=Game.publishers.through)
+def publish_facet_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Связи M2M правят битовые индексы фасетов по журналу FACETS, без полной перезагрузки."""
+    facet = next(
+        facet for facet, (relation, _) in GameRepository.FACET_RELATIONS.items()
+        if getattr(Game, relation).through is sender
+    )
+    if action in ('post_add', 'post_remove'):
+        game_ids, value_ids = (list(pk_set), [instance.pk]) if reverse else ([instance.pk], list(pk_set))
+        publish_change(FACETS, ("link" if action == 'post_add' else "unlink", facet, game_ids, value_ids))
+    elif action == 'post_clear':
+        if reverse:
+            publish_change(FACETS, ("unlink", facet, None, [instance.pk]))
+        else:
+            publish_change(FACETS, ("unlink", facet, [instance.pk], None))
+
+
+@receiver([post_save, post_delete], sender=Game)
+@receiver([post_save, post_delete], sender=Price)
+@receiver([post_save, post_delete], sender=Image)
+@receiver([post_save, post_delete], sender=Language)
+@receiver([post_save, post_delete], sender=Categories)
+@receiver([post_save, post_delete], sender=Publisher)
+@receiver([post_save, post_delete], sender=Consoles)
+def bump_catalog_version(sender, **kwargs):
+    bump_version(CATALOG)
+
+
+@receiver(m2m_changed, sender=Game.voice_acting.through)
+@receiver(m2m_changed, sender=Game.subtitle.through)
+@receiver(m2m_changed, sender=Game.categories.through)
+@receiver(m2m_changed, sender=Game.publishers.through)
+def bump_catalog_version_by_relation(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(CATALOG)
+
+
+@receiver(post_delete, sender=Game)
+@receiver([post_save, post_delete], sender=Price)
+@receiver([post_save, post_delete], sender=Language)
+@receiver([post_save, post_delete], sender=Categories)
+@receiver([post_save, post_delete], sender=Publisher)
+@receiver([post_save, post_delete], sender=Consoles)
+def bump_facets_version(sender, **kwargs):
+    bump_version(FACETS)
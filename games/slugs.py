@@ -0,0 +1,89 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+
+class SlugAllocator:
+    """
+    Уникальные slug для пачки названий: занятые slug с префиксами всех базовых
+    читаются одним запросом, дальше суффиксы -1, -2, … подбираются в памяти
+    по одному набору занятых на всю пачку — так slug "game-1" от "Game" и от
+    "Game 1" не совпадут. Если параллельный импорт успел занять выбранный slug,
+    запись падает на уникальном индексе — тогда занятые slug перечитываются,
+    а выданные в неудачной попытке остаются занятыми, и slug выдаются заново.
+    """
+
+    MAX_ATTEMPTS = 5
+    # Запас под суффикс "-NNNNNN", чтобы slug с суффиксом влезал в max_length.
+    SUFFIX_RESERVE = 7
+    FALLBACK = "game"
+
+    def __init__(self, model, field_name="slug", reserved=()):
+        self.model = model
+        self.field_name = field_name
+        self.max_length = model._meta.get_field(field_name).max_length
+        # reserved — slug, занятые маршрутами; они не выдаются, как и занятые в базе.
+        self.taken = set(reserved)
+        self.loaded = set()
+
+    def base_slug(self, title):
+        """slugify без юникода; название только из кириллицы или символов даёт FALLBACK."""
+        base = slugify(title)[:self.max_length - self.SUFFIX_RESERVE].strip("-")
+        return base or self.FALLBACK
+
+    def load(self, bases, reload=False):
+        """Занятые slug для новых базовых — одним запросом с OR по префиксам."""
+        bases = [base for base in bases if reload or base not in self.loaded]
+        if not bases:
+            return
+        lookup = Q()
+        for base in bases:
+            lookup |= Q(**{f"{self.field_name}__startswith": base})
+        self.taken.update(self.model.objects.filter(lookup).values_list(self.field_name, flat=True))
+        self.loaded.update(bases)
+
+    def allocate(self, titles):
+        bases = [self.base_slug(title) for title in titles]
+        self.load(set(bases))
+        slugs = []
+        for base in bases:
+            # Все кандидаты базового начинаются с него, поэтому занятые из базы для них уже прочитаны.
+            slug, n = base, 1
+            while slug in self.taken:
+                slug = f"{base}-{n}"
+                n += 1
+            self.taken.add(slug)
+            slugs.append(slug)
+        return slugs
+
+    def assign(self, objs):
+        """Проставляет slug объектам без него; возвращает объекты, которым slug выдан здесь."""
+        pending = [obj for obj in objs if not getattr(obj, self.field_name)]
+        for obj, slug in zip(pending, self.allocate([obj.title for obj in pending])):
+            setattr(obj, self.field_name, slug)
+        return pending
+
+    def retry(self, write, objs):
+        assigned = self.assign(objs)
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    return write()
+            except IntegrityError:
+                # Чей индекс нарушен, по ошибке не понять без разбора текста конкретной СУБД,
+                # а чужую строку может не показать снимок транзакции (REPEATABLE READ):
+                # при выданных здесь slug повторяем с новыми, другие ошибки всплывут на последней попытке.
+                if not assigned or attempt == self.MAX_ATTEMPTS:
+                    raise
+                for obj in assigned:
+                    setattr(obj, self.field_name, "")
+                self.load({self.base_slug(obj.title) for obj in assigned}, reload=True)
+                self.assign(assigned)
+
+    def bulk_create(self, objs, **kwargs):
+        """bulk_create с выдачей slug пачке и повтором при конфликте уникальности."""
+        return self.retry(lambda: self.model.objects.bulk_create(objs, **kwargs), objs)
+
+    def save(self, obj, save):
+        """Сохранение одного объекта через save (обычно super().save) с повтором при конфликте slug."""
+        return self.retry(save, [obj])
@@ -1,3 +1,1195 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+
+from config.cache import (
+    CATALOG, CATALOG_ROWS, FACETS, TITLES, LocalCache, bump_version, change_key, clear_local, get_or_set, get_version, local_cache,
+)
+from subscriptions.models import Consoles
+
+from .models import Game, Price, Image, Language, Categories, Publisher, Faq, GameCard, ImportJob
+from .importer import CatalogImporter, ImportJobService
+from .parsing import CatalogRowParser, ImportRowError
+from .indexes import FuzzyTitleIndex, SlugMap, TitlePrefixIndex, slug_map, facet_index, catalog_snapshot
+from .repository import GameCardRepository, GameRepository
+from .serializers import GameSerializer, GameDetailSerializer
+from .services import GameCardService, GameValuesSerializer, PrefetchPlanner
+from .slugs import SlugAllocator
+from .views import AllGames, GameCursorPagination
+
+TEST_TOKEN = "test-token"
+
+
+def seed_catalog(games_count):
+    """Каталог, похожий на боевой: у каждой игры цены на PS4/PS5, языки, категории, издатель и картинки."""
+    ps4, _ = Consoles.objects.get_or_create(name="PS4")
+    ps5, _ = Consoles.objects.get_or_create(name="PS5")
+    categories = [Categories.objects.create(category=f"Категория {i}") for i in range(3)]
+    publishers = [Publisher.objects.create(publisher=f"Издатель {i}") for i in range(2)]
+    languages = [
+        Language.objects.create(code=code, name=name, consoles=console)
+        for code, name in (("ru", "Русский"), ("en", "Английский"))
+        for console in (ps4, ps5)
+    ]
+
+    games = []
+    for i in range(games_count):
+        game = Game.objects.create(
+            title=f"Game {i}",
+            main_image_url=f"https://example.com/{i}.jpg",
+            about=f"Описание игры {i}",
+            release_date=date(2020, 1 + i % 12, 1),
+        )
+        game.categories.add(*categories[:1 + i % 3])
+        game.publishers.add(publishers[i % 2])
+        game.voice_acting.add(*languages)
+        game.subtitle.add(*languages[:2])
+        for console in (ps4, ps5):
+            Price.objects.create(game=game, consoles=console, price=Decimal(1000 + i),
+                                 payment_type="without_activation", sale_amount=Decimal(10) if i % 2 else None)
+            Price.objects.create(game=game, consoles=console, price=Decimal(2000 + i),
+                                 payment_type="with_activation")
+        for n in range(3):
+            Image.objects.create(game=game, image_url=f"https://example.com/{i}/{n}.jpg")
+        Faq.objects.create(game=game, question="Вопрос?", answer="Ответ")
+        games.append(game)
+    return games
+
+
+class QueryBudgetMixin:
+    """
+    Проверяет, что число SQL-запросов эндпоинта не превышает бюджет
+    и не зависит от размера страницы или количества позиций.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.dict(os.environ, {"TOKEN": TEST_TOKEN})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.defaults["HTTP_AUTHORIZATION"] = TEST_TOKEN
+        cache.clear()
+        clear_local()
+        # Снимок каталога и индекс фасетов собираются один раз на версию — как прогретый воркер.
+        catalog_snapshot.refresh()
+        facet_index.ensure_loaded()
+
+    def count_queries(self, method, url, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 400, response.content)
+        return len(context.captured_queries)
+
+    def assertQueryBudget(self, budget, counts):
+        self.assertLessEqual(max(counts), budget, f"Превышен бюджет запросов: {counts}")
+        self.assertEqual(len(set(counts)), 1, f"Число запросов растёт с размером выборки: {counts}")
+
+
+class GameEndpointsQueryBudgetTest(QueryBudgetMixin, TestCase):
+    LIST_COLD_BUDGET = 12
+    LIST_WARM_BUDGET = 4
+    DETAIL_COLD_BUDGET = 11
+    DETAIL_WARM_BUDGET = 2
+    NOT_MODIFIED_BUDGET = 0
+    FACETS_COLD_BUDGET = 1
+    SPARSE_COLD_BUDGET = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.games = seed_catalog(30)
+
+    def test_all_games_cold_cards(self):
+        counts = []
+        for page_size in (2, 10, 30):
+            GameCard.objects.all().delete()
+            counts.append(self.count_queries("get", reverse("games:all_games"), data={"page_size": page_size}))
+        self.assertQueryBudget(self.LIST_COLD_BUDGET, counts)
+
+    def test_all_games_warm_cards(self):
+        self.client.get(reverse("games:all_games"), data={"page_size": 30})
+        cache.clear()
+        clear_local()
+        catalog_snapshot.refresh()
+        facet_index.ensure_loaded()
+        counts = [
+            self.count_queries("get", reverse("games:all_games"), data={"page_size": page_size})
+            for page_size in (2, 10, 30)
+        ]
+        self.assertQueryBudget(self.LIST_WARM_BUDGET, counts)
+
+    def test_all_games_with_filters(self):
+        self.client.get(reverse("games:all_games"), data={"page_size": 30})
+        params = {"category": "Категория 0", "min_price": 900, "has_discount": "true", "title": "game"}
+        counts = [
+            self.count_queries("get", reverse("games:all_games"), data={**params, "page_size": page_size})
+            for page_size in (2, 10)
+        ]
+        self.assertQueryBudget(self.LIST_WARM_BUDGET, counts)
+
+    def test_all_games_cursor_mode(self):
+        self.client.get(reverse("games:all_games"), data={"page_size": 30})
+        counts = [
+            self.count_queries("get", reverse("games:all_games"), data={"pagination": "cursor", "page_size": page_size})
+            for page_size in (2, 10, 30)
+        ]
+        self.assertQueryBudget(self.LIST_WARM_BUDGET - 1, counts)
+
+    def test_game_detail(self):
+        cold, warm = [], []
+        for game in self.games[:3]:
+            url = reverse("games:game_detail", args=[game.id])
+            cold.append(self.count_queries("get", url))
+            warm.append(self.count_queries("get", url))
+        self.assertQueryBudget(self.DETAIL_COLD_BUDGET, cold)
+        self.assertQueryBudget(self.DETAIL_WARM_BUDGET, warm)
+
+    def test_game_detail_by_slug(self):
+        slug_map.load(GameRepository.get_slug_rows())
+        counts = []
+        for game in self.games[:3]:
+            self.count_queries("get", reverse("games:game_detail", args=[game.id]))
+            counts.append(self.count_queries("get", reverse("games:game_detail", args=[game.slug])))
+        self.assertQueryBudget(self.DETAIL_WARM_BUDGET, counts)
+
+        game = self.games[0]
+        game.title = f"{game.title} Remastered"
+        game.slug = ""
+        game.save()
+        response = self.client.get(reverse("games:game_detail", args=[game.slug]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["id"], str(game.id))
+        response = self.client.get(reverse("games:game_detail", args=["no-such-game"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_game_detail_does_not_grow_with_relations(self):
+        rich_game, plain_game = self.games[0], self.games[1]
+        for n in range(20):
+            Image.objects.create(game=rich_game, image_url=f"https://example.com/extra/{n}.jpg")
+        counts = [
+            self.count_queries("get", reverse("games:game_detail", args=[game.id]))
+            for game in (rich_game, plain_game)
+        ]
+        self.assertQueryBudget(self.DETAIL_COLD_BUDGET, counts)
+
+    def test_sparse_fieldsets(self):
+        url = reverse("games:all_games")
+        params = {"fields": "title,main_image_url,prices", "page_size": 10}
+        cold = self.count_queries("get", url, data=params)
+        self.assertLessEqual(cold, self.SPARSE_COLD_BUDGET)
+        results = self.client.get(url, data=params).json()["results"]
+        self.assertEqual(set(results[0]), {"id", "title", "main_image_url", "prices"})
+
+        self.client.get(url, data={"page_size": 10})
+        warm = self.client.get(url, data=params).json()["results"]
+        self.assertEqual(warm, results)
+
+        detail = self.client.get(reverse("games:game_detail", args=[self.games[5].id]),
+                                 data={"exclude": "about,images,prices"}).json()
+        self.assertNotIn("images", detail)
+        self.assertIn("voice_acting", detail)
+
+    def test_game_batch(self):
+        url = reverse("games:game_batch")
+        counts = []
+        for size in (2, 6, 12):
+            GameCard.objects.all().delete()
+            ids = [str(game.id) for game in self.games[:size]]
+            counts.append(self.count_queries("get", url, data={"ids": ",".join(ids)}))
+        self.assertQueryBudget(self.DETAIL_COLD_BUDGET, counts)
+
+        slug_map.load(GameRepository.get_slug_rows())
+        identifiers = [self.games[3].slug, "missing-game", str(self.games[1].id), self.games[3].slug]
+        response = self.client.post(url, {"ids": identifiers}, content_type="application/json").json()
+        self.assertEqual([item["id"] for item in response["results"]], [str(self.games[3].id), str(self.games[1].id)])
+        self.assertEqual(response["not_found"], ["missing-game"])
+
+    def test_game_facets(self):
+        url = reverse("games:game_facets")
+        cold = self.count_queries("get", url, data={"has_discount": "true"})
+        warm = self.count_queries("get", url, data={"has_discount": "true"})
+        self.assertEqual((cold, warm), (self.FACETS_COLD_BUDGET, 0))
+
+        facets = self.client.get(url).json()
+        self.assertEqual([item["count"] for item in facets["categories"]], [30, 20, 10])
+        self.assertEqual({item["name"]: item["count"] for item in facets["consoles"]}, {"PS4": 30, "PS5": 30})
+        self.assertEqual(len(facets["voice_acting"]), 4)
+
+        facets = self.client.get(url, data={"has_discount": "true"}).json()
+        self.assertEqual([item["count"] for item in facets["publishers"]], [15])
+
+        # Названия категорий и консолей в фильтре — как в базе, с учётом регистра.
+        facets = self.client.get(url, data={"category": "Категория 0", "console": "PS5"}).json()
+        self.assertEqual({item["name"]: item["count"] for item in facets["consoles"]}, {"PS4": 30, "PS5": 30})
+        self.assertEqual([item["count"] for item in facets["publishers"]], [15, 15])
+        facets = self.client.get(url, data={"category": "Категория 2"}).json()
+        self.assertEqual([item["count"] for item in facets["categories"]], [10, 10, 10])
+
+    def test_response_cache(self):
+        list_url = reverse("games:all_games")
+        detail_url = reverse("games:game_detail", args=[self.games[0].id])
+        # Оба ответа и их валидаторы берутся из кэша, без запросов к базе.
+        for url, params, budget in ((list_url, {"page_size": 5, "ordering": "-price"}, 0),
+                                    (detail_url, {}, self.NOT_MODIFIED_BUDGET)):
+            self.client.get(url, data=params)
+            self.assertEqual(self.count_queries("get", url, data=params), budget)
+
+        game = self.games[0]
+        game.title = "Переименованная игра"
+        game.save()
+        self.assertEqual(self.client.get(detail_url).json()["title"], "Переименованная игра")
+
+    def test_fragment_rendering_and_gzip(self):
+        url = reverse("games:all_games")
+        cold = self.client.get(url, data={"page_size": 5})
+        plain = self.client.get(url, data={"page_size": 5})
+        compressed = self.client.get(url, data={"page_size": 5}, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(cold.content, plain.content)
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        expected = [json.loads(GameCardService.encode(GameSerializer(game).data))
+                    for game in GameRepository.get_by_ids([item["id"] for item in plain.json()["results"]],
+                                                          PrefetchPlanner.plan(GameSerializer))]
+        self.assertCountEqual(plain.json()["results"], expected)
+
+    def test_browsable_api_with_cached_fragments(self):
+        url = reverse("games:all_games")
+        for _ in range(2):
+            response = self.client.get(url, data={"page_size": 5}, HTTP_ACCEPT="text/html")
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "Game 0")
+        self.assertEqual(len(self.client.get(url, data={"page_size": 5}).json()["results"]), 5)
+
+    def test_local_cache_tier(self):
+        url = reverse("games:game_detail", args=[self.games[2].id])
+        self.client.get(url)
+        hits = local_cache.hits
+        cache.clear()
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(local_cache.hits, hits + 1)
+
+        bounded = LocalCache(max_size=2, ttl=60)
+        for key in ("a", "b", "a", "c"):
+            bounded.set(key, key)
+        self.assertEqual((bounded.get("a"), bounded.get("b")), ("a", None))
+        self.assertEqual(bounded.stats()["evictions"], 1)
+
+    def test_not_modified(self):
+        budgets = ((reverse("games:all_games"), 0), (reverse("games:game_facets"), 0),
+                   (reverse("games:game_detail", args=[self.games[0].id]), self.NOT_MODIFIED_BUDGET))
+        for url, budget in budgets:
+            etag = self.client.get(url).headers["ETag"]
+            self.assertTrue(etag.startswith('W/"'), etag)
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertLessEqual(len(context.captured_queries), budget, url)
+
+    def test_etag_follows_catalog_version(self):
+        url = reverse("games:all_games")
+        plain = self.client.get(url)
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(compressed["ETag"], plain["ETag"])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=plain["ETag"], HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 304)
+
+        price = self.games[3].prices.first()
+        price.price = Decimal(1)
+        price.save()
+        clear_local()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=plain["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], plain["ETag"])
+
+
+class GameCursorPaginationTest(QueryBudgetMixin, TestCase):
+    """Keyset-курсор проходит каталог без пропусков и повторов при NULL и одинаковых датах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        release_dates = [None, date(2021, 5, 1), None, date(2020, 1, 1), date(2021, 5, 1), date(2021, 5, 1), None]
+        cls.games = [
+            Game.objects.create(title=f"Cursor {i}", main_image_url=f"https://example.com/c{i}.jpg",
+                                release_date=release_date)
+            for i, release_date in enumerate(release_dates)
+        ]
+
+    def walk(self, ordering=None, page_size=2):
+        params = {"pagination": "cursor", "page_size": page_size}
+        if ordering:
+            params["ordering"] = ordering
+        ids, url = [], reverse("games:all_games")
+        while url:
+            response = self.client.get(url, data=params)
+            self.assertEqual(response.status_code, 200, response.content)
+            body = response.json()
+            self.assertLessEqual(len(body["results"]), page_size)
+            ids += [item["id"] for item in body["results"]]
+            url, params = body["next"], None
+        return ids
+
+    def expected(self, descending=False):
+        # NULL — в начале по возрастанию и в конце по убыванию, при равенстве даты — по id.
+        def key(game):
+            if descending:
+                return game.release_date is None, -(game.release_date or date.min).toordinal(), game.id
+            return game.release_date is not None, game.release_date or date.min, game.id
+        return [str(game.id) for game in sorted(self.games, key=key)]
+
+    def test_ascending_with_nulls_and_ties(self):
+        for page_size in (1, 2, 3, 10):
+            self.assertEqual(self.walk(page_size=page_size), self.expected(), page_size)
+
+    def test_descending(self):
+        for page_size in (1, 2, 3):
+            self.assertEqual(self.walk("-release_date", page_size), self.expected(descending=True), page_size)
+
+    def test_cursor_position_is_exclusive(self):
+        paginator = GameCursorPagination()
+        ordered = self.expected()
+        game = next(game for game in self.games if str(game.id) == ordered[3])
+        cursor = paginator.encode_cursor(game.release_date, game.id)
+        response = self.client.get(reverse("games:all_games"), data={"cursor": cursor, "page_size": 10})
+        self.assertEqual([item["id"] for item in response.json()["results"]], ordered[4:])
+
+    def test_malformed_and_tampered_cursors(self):
+        game = self.games[1]
+        valid = GameCursorPagination().encode_cursor(game.release_date, game.id)
+        tampered = [
+            "not-base64!",
+            valid[:-4],
+            base64.urlsafe_b64encode(b"{}").decode(),
+            base64.urlsafe_b64encode(json.dumps(["2021-05-01"]).encode()).decode(),
+            base64.urlsafe_b64encode(json.dumps(["yesterday", str(game.id)]).encode()).decode(),
+            base64.urlsafe_b64encode(json.dumps(["2021-05-01", "not-a-uuid"]).encode()).decode(),
+            base64.urlsafe_b64encode(json.dumps(["2021-05-01", str(game.id), "extra"]).encode()).decode(),
+        ]
+        for cursor in tampered:
+            response = self.client.get(reverse("games:all_games"), data={"cursor": cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+        self.assertEqual(self.client.get(reverse("games:all_games"), data={"cursor": valid}).status_code, 200)
+
+
+class PriceBoundsTest(TestCase):
+    """effective_price считается при сохранении цены, а границы цен игры — после каждого изменения цен."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ps4, _ = Consoles.objects.get_or_create(name="PS4")
+        cls.ps5, _ = Consoles.objects.get_or_create(name="PS5")
+        cls.game = Game.objects.create(title="Bounds", main_image_url="https://example.com/bounds.jpg")
+
+    def bounds(self):
+        self.game.refresh_from_db()
+        return self.game.min_price, self.game.max_price, self.game.has_discount
+
+    def test_effective_price_with_percent_discount(self):
+        price = Price.objects.create(game=self.game, consoles=self.ps4, price=Decimal("2000"),
+                                     sale_unit="percent", sale_amount=Decimal("15"))
+        self.assertEqual(price.effective_price, Decimal("1700"))
+
+        price.sale_amount = Decimal("50")
+        price.save(update_fields=["sale_amount"])
+        price.refresh_from_db()
+        self.assertEqual(price.effective_price, Decimal("1000"))
+
+    def test_effective_price_with_absolute_discount(self):
+        price = Price.objects.create(game=self.game, consoles=self.ps4, price=Decimal("2000"),
+                                     sale_unit="price", sale_amount=Decimal("350"))
+        self.assertEqual(price.effective_price, Decimal("1650"))
+
+        price.sale_amount = None
+        price.save()
+        self.assertEqual(price.effective_price, Decimal("2000"))
+
+    def test_bounds_follow_price_changes(self):
+        self.assertEqual(self.bounds(), (None, None, False))
+
+        cheap = Price.objects.create(game=self.game, consoles=self.ps4, price=Decimal("1000"))
+        self.assertEqual(self.bounds(), (Decimal("1000"), Decimal("1000"), False))
+
+        Price.objects.create(game=self.game, consoles=self.ps5, price=Decimal("3000"),
+                             sale_unit="percent", sale_amount=Decimal("10"))
+        self.assertEqual(self.bounds(), (Decimal("1000"), Decimal("2700"), True))
+
+        cheap.price = Decimal("2900")
+        cheap.save()
+        self.assertEqual(self.bounds(), (Decimal("2700"), Decimal("2900"), True))
+
+        cheap.is_active = False
+        cheap.save()
+        self.assertEqual(self.bounds(), (Decimal("2700"), Decimal("2700"), True))
+
+        self.game.prices.filter(consoles=self.ps5).get().delete()
+        self.assertEqual(self.bounds(), (None, None, False))
+
+
+class GameSearchTest(TestCase):
+    """Поиск по названию и описанию: FULLTEXT в MySQL и LIKE-фолбэк с тем же порядком релевантности."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.title_match = Game.objects.create(title="Dark Souls Remastered", about="Ролевой экшен",
+                                              main_image_url="https://example.com/ds.jpg")
+        cls.both_match = Game.objects.create(title="Dark Forest", about="Souls-like в тёмном лесу",
+                                             main_image_url="https://example.com/df.jpg")
+        cls.about_match = Game.objects.create(title="Lords of the Fallen", about="Dark souls-like",
+                                              main_image_url="https://example.com/lf.jpg")
+        cls.partial = Game.objects.create(title="Dark Chronicle", about="JRPG",
+                                          main_image_url="https://example.com/dc.jpg")
+
+    def test_like_fallback_requires_all_terms_and_orders_by_relevance(self):
+        results = GameRepository.search(Game.objects.all(), "dark souls").order_by("-relevance", "title")
+        self.assertEqual(
+            [(game.id, game.relevance) for game in results],
+            [(self.title_match.id, 4.0), (self.both_match.id, 3.0), (self.about_match.id, 2.0)],
+        )
+
+    def test_query_without_words_keeps_queryset(self):
+        self.assertEqual(GameRepository.search(Game.objects.all(), " !? ").count(), 4)
+
+    def test_mysql_uses_boolean_mode_fulltext(self):
+        with mock.patch("games.repository.connection", mock.Mock(vendor="mysql")):
+            queryset = GameRepository.search(Game.objects.all(), "dark souls!").order_by("-relevance")
+        sql, params = queryset.query.sql_with_params()
+        self.assertIn('MATCH ("games_game"."title", "games_game"."about") AGAINST (%s IN BOOLEAN MODE)', sql)
+        self.assertIn("+dark* +souls*", params)
+        self.assertNotIn("LIKE", sql)
+
+    def test_mysql_fulltext_follows_subquery_alias(self):
+        # Фасеты фильтруют по id__in=games.values('id'): таблица в подзапросе получает алиас U0.
+        # mysqlclient в тестах не установлен, поэтому SQL собирается компилятором тестовой СУБД.
+        with mock.patch("games.repository.connection", mock.Mock(vendor="mysql")):
+            games = GameRepository.search(GameRepository.get_available(), "dark souls")
+        sql, params = Game.categories.through.objects.filter(game_id__in=games.values("id")).query.sql_with_params()
+        self.assertIn('MATCH (U0."title", U0."about") AGAINST (%s IN BOOLEAN MODE)', sql)
+        self.assertNotIn("games_game.title", sql)
+        self.assertIn("+dark* +souls*", params)
+
+
+class GameSuggestTest(QueryBudgetMixin, TestCase):
+    """Автодополнение по префиксу и обновление индекса названий при добавлении, переименовании и удалении игр."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for title in ("Spider-Man", "Spider-Man: Miles Morales", "The Amazing Spider-Man", "Gran Turismo 7"):
+            Game.objects.create(title=title, main_image_url="https://example.com/suggest.jpg")
+
+    def suggest(self, query, **params):
+        response = self.client.get(reverse("games:game_suggest"), data={"q": query, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [item["title"] for item in response.json()]
+
+    def test_suggest_ranks_title_prefix_first(self):
+        self.assertEqual(
+            self.suggest("spider"),
+            ["Spider-Man", "Spider-Man: Miles Morales", "The Amazing Spider-Man"],
+        )
+        self.assertEqual(self.suggest("MILES"), ["Spider-Man: Miles Morales"])
+        self.assertEqual(self.suggest("spider", limit=1), ["Spider-Man"])
+        self.assertEqual(self.suggest("  "), [])
+        response = self.client.get(reverse("games:game_suggest"), data={"q": "spider", "limit": "many"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_collection_routes_do_not_shadow_game_slugs(self):
+        self.assertEqual(reverse("games:game_suggest"), "/api/games/suggest")
+        for title in ("Suggest", "Facets", "Batch"):
+            game = Game.objects.create(title=title, main_image_url="https://example.com/reserved.jpg")
+            self.assertEqual(game.slug, f"{title.lower()}-1")
+            response = self.client.get(reverse("games:game_detail", args=[game.slug]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["id"], str(game.id))
+        game.slug = "batch"
+        game.save()
+        self.assertEqual(game.slug, "batch-2")
+
+    def test_index_follows_game_changes(self):
+        self.suggest("spider")
+        game = Game.objects.create(title="Horizon Forbidden West", main_image_url="https://example.com/h.jpg")
+        self.assertEqual(self.suggest("horizon"), ["Horizon Forbidden West"])
+
+        game.title = "Horizon Zero Dawn"
+        game.save()
+        self.assertEqual(self.suggest("horizon"), ["Horizon Zero Dawn"])
+        self.assertEqual(self.suggest("forbidden"), [])
+
+        game.is_available = False
+        game.save()
+        self.assertEqual(self.suggest("horizon"), [])
+
+        Game.objects.get(title="Gran Turismo 7").delete()
+        self.assertEqual(self.suggest("gran"), [])
+
+
+class TitleChangeLogTest(TestCase):
+    """Индексы названий соседнего воркера догоняют правки по журналу TITLES без перезагрузки из базы."""
+
+    def setUp(self):
+        cache.clear()
+        clear_local()
+        self.game = Game.objects.create(title="Bloodborne", main_image_url="https://example.com/bb.jpg")
+        # Индексы «другого воркера»: сигналы этого процесса их не трогают.
+        self.indexes = (TitlePrefixIndex(), FuzzyTitleIndex(), SlugMap())
+        for index in self.indexes:
+            index.ensure_loaded()
+
+    def publish(self, change):
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        clear_local()
+
+    def test_changes_are_applied_without_queries(self):
+        prefix, fuzzy, slugs = self.indexes
+        self.publish(lambda: Game.objects.create(title="Demon's Souls", main_image_url="https://example.com/ds.jpg"))
+        self.game.title = "Bloodborne GOTY"
+        self.publish(self.game.save)
+
+        with self.assertNumQueries(0):
+            self.assertEqual([item["title"] for item in prefix.suggest("demon")], ["Demon's Souls"])
+            self.assertEqual([item["title"] for item in prefix.suggest("blood")], ["Bloodborne GOTY"])
+            self.assertEqual(len(fuzzy.search("demons souls")), 1)
+            self.assertEqual(slugs.resolve("bloodborne"), self.game.id)
+
+        self.publish(self.game.delete)
+        with self.assertNumQueries(0):
+            self.assertEqual(prefix.suggest("blood"), [])
+            self.assertEqual(fuzzy.search("bloodborne"), [])
+
+    def test_missing_change_falls_back_to_full_reload(self):
+        prefix = self.indexes[0]
+        self.publish(lambda: Game.objects.create(title="Returnal", main_image_url="https://example.com/r.jpg"))
+        cache.delete(change_key(TITLES, get_version(TITLES)))
+        with self.assertNumQueries(1):
+            self.assertEqual([item["title"] for item in prefix.suggest("return")], ["Returnal"])
+
+
+class FuzzyTitleIndexTest(TestCase):
+    """Нечёткий поиск прощает опечатки, понимает кириллическое написание и ранжирует точные совпадения выше."""
+
+    TITLES = (
+        "Spider-Man", "Spider-Man: Miles Morales", "Marvel's Spider-Man 2", "Ghost of Tsushima",
+        "The Witcher 3: Wild Hunt", "Horizon Zero Dawn", "Gran Turismo 7",
+    )
+
+    def setUp(self):
+        cache.clear()
+        clear_local()
+        self.ids = {title: uuid.uuid4() for title in self.TITLES}
+        self.index = FuzzyTitleIndex()
+        self.index.load([(game_id, title, None) for title, game_id in self.ids.items()], version=get_version(TITLES))
+
+    def search(self, query):
+        titles = {game_id: title for title, game_id in self.ids.items()}
+        return [titles[game_id] for game_id in self.index.search(query)]
+
+    def test_typos(self):
+        self.assertEqual(self.search("horizn"), ["Horizon Zero Dawn"])
+        self.assertEqual(self.search("spidr man")[0], "Spider-Man")
+        self.assertEqual(self.search("gost of tsushima"), ["Ghost of Tsushima"])
+        self.assertEqual(self.search("zzzz"), [])
+
+    def test_cyrillic_transliteration(self):
+        self.assertEqual(self.search("спайдер мэн"), self.search("spider man"))
+        self.assertEqual(self.search("витчер"), ["The Witcher 3: Wild Hunt"])
+        self.assertEqual(self.search("гост оф цусима"), ["Ghost of Tsushima"])
+
+    def test_ranking(self):
+        self.assertEqual(self.search("spider"), ["Spider-Man", "Spider-Man: Miles Morales", "Marvel's Spider-Man 2"])
+        self.assertEqual(self.search("spider man 2")[0], "Marvel's Spider-Man 2")
+
+        self.index.remove(self.ids["Spider-Man"])
+        self.index.add(self.ids["Spider-Man"], "Spider-Man Remastered Game of the Year")
+        # Начало названия совпадает с запросом — выше, из таких раньше идут короткие названия.
+        self.assertEqual(self.search("spider"), ["Spider-Man: Miles Morales", "Spider-Man", "Marvel's Spider-Man 2"])
+
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command("benchmark_fuzzy_search", titles=300, queries=20, stdout=output)
+        self.assertIn("нужная игра в первых 10", output.getvalue())
+
+
+class GameCardServiceTest(TestCase):
+    """Карточка, собранная из строк до правки и сохранённая после её удаления, не отдаётся."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.game = seed_catalog(1)[0]
+
+    def test_card_saved_after_invalidation_is_rebuilt(self):
+        stale = GameCardService.get_cards([self.game.id])[self.game.id]
+        Image.objects.create(game=self.game, image_url="https://example.com/new.jpg")
+        # Читатель, начавший до правки, сохраняет свою карточку уже после её удаления.
+        GameCardRepository.bulk_save([stale])
+
+        payload = GameCardService.get_detail_payload(self.game.id)
+        self.assertIn("https://example.com/new.jpg", payload["images"])
+        card = GameCard.objects.get(game=self.game)
+        self.assertEqual(card.source_updated_at, Game.objects.get(id=self.game.id).updated_at)
+
+
+class GameValuesSerializerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.games = seed_catalog(12)
+        Price.objects.filter(game=cls.games[3], payment_type="with_activation").update(is_active=False)
+        Game.objects.filter(id=cls.games[4].id).update(about=None, release_date=None)
+
+    def test_matches_drf_serializers_byte_for_byte(self):
+        game_ids = [game.id for game in self.games]
+        for serializer_class, fields in ((GameSerializer, None), (GameDetailSerializer, None),
+                                         (GameSerializer, ["title", "prices", "consoles"])):
+            expected = {
+                game.id: GameCardService.encode(serializer_class(game, fields=fields).data)
+                for game in GameRepository.get_by_ids(game_ids, PrefetchPlanner.plan(serializer_class, fields))
+            }
+            actual = {
+                game_id: GameCardService.encode(data)
+                for game_id, data in GameValuesSerializer.serialize(game_ids, serializer_class, fields).items()
+            }
+            self.assertEqual(actual, expected)
+
+    def test_benchmark_command(self):
+        output = StringIO()
+        call_command("benchmark_game_serializers", games=5, repeat=1, stdout=output)
+        self.assertIn("совпадает байт в байт", output.getvalue())
+
+
+class PrefetchPlannerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.games = seed_catalog(4)
+
+    def test_plan_covers_serializer_without_extra_queries(self):
+        for serializer_class, fields in ((GameSerializer, None), (GameDetailSerializer, None),
+                                         (GameSerializer, ["title", "main_image_url", "prices"])):
+            plan = PrefetchPlanner.plan(serializer_class, fields)
+            with CaptureQueriesContext(connection) as loading:
+                games = list(GameRepository.get_by_ids([game.id for game in self.games], plan))
+            with CaptureQueriesContext(connection) as serializing:
+                [serializer_class(game, fields=fields).data for game in games]
+            self.assertEqual(len(loading.captured_queries), 1 + len(plan["prefetch_related"]))
+            self.assertEqual(serializing.captured_queries, [], f"{serializer_class.__name__} вышел за план")
+
+    def test_plan_is_minimal(self):
+        plan = PrefetchPlanner.plan(GameSerializer)
+        self.assertEqual(
+            sorted(prefetch.prefetch_through for prefetch in plan["prefetch_related"]),
+            ["categories", "images", "prices", "publishers", "subtitle", "voice_acting"],
+        )
+        plan = PrefetchPlanner.plan(GameSerializer, ["title", "prices"])
+        self.assertEqual([prefetch.prefetch_through for prefetch in plan["prefetch_related"]], ["prices"])
+        self.assertEqual(plan["only"], ["id", "title"])
+
+    def test_undeclared_accessor_fails(self):
+        class FaqSerializer(GameSerializer):
+            faqs = serializers.SerializerMethodField()
+
+            class Meta(GameSerializer.Meta):
+                fields = GameSerializer.Meta.fields + ["faqs"]
+
+            def get_faqs(self, obj):
+                return [faq.question for faq in obj.faqs.all()]
+
+        with self.assertRaises(ImproperlyConfigured):
+            PrefetchPlanner.plan(FaqSerializer)
+
+
+class CacheCoalescingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local()
+
+    def test_single_flight(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"value": 42}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_set("test", ("hot",), loader, 60)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"value": 42}] * 8)
+
+    @override_settings(CACHE_REFRESH_IN_BACKGROUND=True)
+    def test_stale_while_revalidate(self):
+        get_or_set("test", ("page",), lambda: "old", 60)
+        bump_version("test")
+        refreshed = threading.Event()
+
+        def loader():
+            refreshed.set()
+            return "new"
+
+        self.assertEqual(get_or_set("test", ("page",), loader, 60), "old")
+        self.assertTrue(refreshed.wait(2))
+        time.sleep(0.05)
+        self.assertEqual(get_or_set("test", ("page",), lambda: "unused", 60), "new")
+
+
+class StaleResponseTest(QueryBudgetMixin, TestCase):
+    """Устаревший ответ отдаётся с валидаторами своей версии и пересобирается запросом, а не фоновым потоком."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.games = seed_catalog(3)
+
+    def rename(self, title):
+        game = self.games[0]
+        game.title = title
+        game.save()
+        clear_local()
+
+    def test_stale_body_is_not_validated_by_current_state(self):
+        url = reverse("games:game_detail", args=[self.games[0].id])
+        self.client.get(url)
+        self.rename("Новое название")
+        # Соседний воркер уже пересобирает запись — этот отдаёт устаревшую.
+        with mock.patch("config.cache._refresh", return_value=None):
+            stale = self.client.get(url)
+            self.assertEqual(stale.json()["title"], "Game 0")
+            # Валидатор описывает отданное тело: пока отдаётся оно же, 304 верен.
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=stale["ETag"])
+            self.assertEqual(revalidated.status_code, 304)
+
+        refreshed = self.client.get(url, HTTP_IF_NONE_MATCH=stale["ETag"])
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertEqual(refreshed.json()["title"], "Новое название")
+        self.assertNotEqual(refreshed["ETag"], stale["ETag"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=refreshed["ETag"]).status_code, 304)
+
+    def test_lagging_version_keeps_validators_of_cached_body(self):
+        url = reverse("games:game_detail", args=[self.games[0].id])
+        first = self.client.get(url)
+        # Правка уже в базе, но версия каталога в этом воркере ещё не сменилась.
+        with mock.patch("games.signals.bump_version"), mock.patch("games.signals.publish_change"):
+            self.rename("Новое название")
+        cached = self.client.get(url)
+        self.assertEqual(cached.json()["title"], "Game 0")
+        self.assertEqual(cached["ETag"], first["ETag"])
+        self.assertEqual(cached["Last-Modified"], first["Last-Modified"])
+
+        bump_version(CATALOG)
+        clear_local()
+        refreshed = self.client.get(url, HTTP_IF_NONE_MATCH=cached["ETag"])
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertEqual(refreshed.json()["title"], "Новое название")
+
+    @override_settings(CACHE_REFRESH_IN_BACKGROUND=True)
+    def test_stale_response_is_rebuilt_in_request(self):
+        url = reverse("games:all_games")
+        self.client.get(url, data={"page_size": 5, "ordering": "release_date"})
+        self.rename("Aaa")
+        with mock.patch("config.cache.threading.Thread") as thread:
+            response = self.client.get(url, data={"page_size": 5, "ordering": "release_date"})
+        thread.assert_not_called()
+        self.assertIn("Aaa", [item["title"] for item in response.json()["results"]])
+
+
+class CatalogSnapshotTest(TestCase):
+    """Снимок каталога отдаёт те же id и в том же порядке, что и запрос к базе."""
+
+    PARAMS = (
+        {},
+        {"category": "Категория 2"},
+        {"console": "PS5", "publisher": "Нет такого"},
+        {"min_price": "1005", "max_price": "1015"},
+        {"has_discount": "true", "category": "Категория 1"},
+        {"category": "Нет такой"},
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.games = seed_catalog(20)
+        Game.objects.filter(id=cls.games[0].id).update(release_date=None)
+        Price.objects.filter(game=cls.games[1]).update(is_active=False)
+        GameRepository.refresh_price_bounds([cls.games[1].id])
+        cls.publisher = Publisher.objects.get(publisher="Издатель 0")
+
+    def setUp(self):
+        cache.clear()
+        clear_local()
+
+    def assertMatchesDatabase(self, params, ordering):
+        queryset = AllGames.filter_catalog(GameRepository.get_available().only("id"), params)
+        expected = list(GameCursorPagination.order_queryset(queryset, ordering).values_list("id", flat=True))
+        self.assertEqual(catalog_snapshot.query(params, ordering), expected, (params, ordering))
+
+    def test_filters_and_ordering_match_database(self):
+        for params in self.PARAMS:
+            for ordering in ("-release_date", "release_date", "min_price", "-min_price"):
+                self.assertMatchesDatabase(params, ordering)
+
+    def test_title_search_falls_back_to_database(self):
+        self.assertIsNone(catalog_snapshot.query({"title": "Game"}, "-release_date"))
+
+    def test_console_with_price_falls_back_to_database(self):
+        # У игры дешёвая цена только на PS5: на PS4 она не должна попадать в диапазон.
+        game = self.games[5]
+        ps4 = Consoles.objects.get(name="PS4")
+        with self.captureOnCommitCallbacks(execute=True):
+            Price.objects.filter(game=game, consoles=ps4).update(price=Decimal(5000), effective_price=Decimal(5000))
+            GameRepository.refresh_price_bounds([game.id])
+        params = {"console": "PS4", "max_price": "1010"}
+        self.assertIsNone(catalog_snapshot.query(params, "min_price"))
+        queryset = AllGames.filter_catalog(GameRepository.get_available(), params)
+        self.assertNotIn(game.id, queryset.values_list("id", flat=True))
+        queryset = AllGames.filter_catalog(GameRepository.get_available(), {**params, "console": "PS5"})
+        self.assertIn(game.id, queryset.values_list("id", flat=True))
+
+    def test_incremental_refresh(self):
+        catalog_snapshot.query({}, "min_price")
+        game, deleted = self.games[4], self.games[6]
+        deleted_id = deleted.id
+        with self.captureOnCommitCallbacks(execute=True):
+            price = game.prices.filter(payment_type="without_activation").first()
+            price.price = Decimal(1)
+            price.save()
+            game.categories.remove(*game.categories.all())
+            deleted.delete()
+            added = Game.objects.create(title="Added", release_date=date(2019, 1, 1))
+        with mock.patch.object(GameRepository, "get_snapshot_rows", wraps=GameRepository.get_snapshot_rows) as rows:
+            for params in ({}, {"category": "Категория 0"}, {"console": "PS4", "publisher": str(self.publisher.id)}):
+                self.assertMatchesDatabase(params, "min_price")
+        # Дочитаны только изменённые игры, без полной пересборки.
+        rows.assert_called_once_with({game.id, deleted_id, added.id})
+        self.assertEqual(catalog_snapshot.query({"min_price": "1"}, "min_price")[0], game.id)
+        self.assertNotIn(deleted_id, catalog_snapshot.query({}, "min_price"))
+
+    def test_missing_change_falls_back_to_full_rebuild(self):
+        catalog_snapshot.query({}, "min_price")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.games[4].delete()
+        cache.delete(change_key(CATALOG_ROWS, get_version(CATALOG_ROWS)))
+        with mock.patch.object(GameRepository, "get_snapshot_rows", wraps=GameRepository.get_snapshot_rows) as rows:
+            self.assertMatchesDatabase({}, "min_price")
+        rows.assert_called_once_with()
+
+
+class FacetBitmapIndexTest(TestCase):
+    """Битовые индексы фасетов совпадают с фильтром через M2M и следят за m2m_changed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.games = seed_catalog(12)
+        cls.categories = list(Categories.objects.order_by("category"))
+        cls.publisher = Publisher.objects.get(publisher="Издатель 0")
+        cls.russian = Language.objects.filter(code="ru").first()
+
+    def setUp(self):
+        cache.clear()
+        clear_local()
+
+    def expected(self, **lookups):
+        queryset = Game.objects.all()
+        for lookup, value in lookups.items():
+            queryset = queryset.filter(**{lookup: value})
+        return set(queryset.values_list("id", flat=True))
+
+    def test_multi_facet_match(self):
+        self.assertIsNone(facet_index.match({"min_price": "10"}))
+        self.assertEqual(
+            set(facet_index.match({
+                "category": "Категория 2",
+                "console": "PS5",
+                "publisher": str(self.publisher.id),
+                "voice_acting": str(self.russian.id),
+            })),
+            self.expected(categories__category="Категория 2", publishers=self.publisher, voice_acting=self.russian),
+        )
+        self.assertEqual(
+            set(facet_index.match({"category": "Категория 1,Категория 2", "publisher": str(self.publisher.id)})),
+            self.expected(categories__category__in=["Категория 1", "Категория 2"], publishers=self.publisher),
+        )
+        self.assertEqual(facet_index.match({"category": "Нет такой"}), [])
+
+    def test_m2m_changes_update_bitmaps(self):
+        facet_index.ensure_loaded()
+        game = self.games[0]
+        category = self.categories[2]
+        with mock.patch.object(GameRepository, "get_facet_rows", wraps=GameRepository.get_facet_rows) as rows:
+            with self.captureOnCommitCallbacks(execute=True):
+                game.categories.add(category)
+            self.assertIn(game.id, facet_index.match({"category": category.category}))
+            with self.captureOnCommitCallbacks(execute=True):
+                category.category_games.remove(game)
+            self.assertNotIn(game.id, facet_index.match({"category": category.category}))
+            with self.captureOnCommitCallbacks(execute=True):
+                game.publishers.clear()
+            self.assertNotIn(game.id, facet_index.match({"publisher": str(self.publisher.id)}))
+        # Изменения связей применены по журналу FACETS, без полной перезагрузки.
+        rows.assert_not_called()
+
+    def test_missing_change_falls_back_to_full_reload(self):
+        facet_index.ensure_loaded()
+        game = self.games[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            game.categories.add(self.categories[2])
+        cache.delete(change_key(FACETS, get_version(FACETS)))
+        with mock.patch.object(GameRepository, "get_facet_rows", wraps=GameRepository.get_facet_rows) as rows:
+            self.assertIn(game.id, facet_index.match({"category": self.categories[2].category}))
+        rows.assert_called_once_with()
+
+
+def build_workbook(rows):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Название", "Цены", "Картинка", "Описание"])
+    for row in rows:
+        sheet.append(row)
+    file = BytesIO()
+    workbook.save(file)
+    file.seek(0)
+    return file
+
+
+def supplier_rows(count, price=1000):
+    return [
+        (f"Import {i}", f"{price + i}::{0 if i % 2 else 1500}::1800::PS4 - Русский/Английский | PS5 - Русский::01.0{1 + i % 9}.2021",
+         f"https://example.com/import/{i}.jpg", f"Описание {i}")
+        for i in range(count)
+    ]
+
+
+class CatalogRowParserTest(SimpleTestCase):
+    """Пустая цена PS4 с активацией и нулевая — разные строки прайса."""
+
+    @staticmethod
+    def parse(price_data):
+        return CatalogRowParser.parse(("Game", price_data, None, None))
+
+    def test_zero_ps4_activation_means_ps5_only(self):
+        data = self.parse("1000::0::1800::Русский/Английский::01.01.2021")
+        self.assertEqual({console for console, _, _ in data["prices"]}, {"PS5"})
+        self.assertEqual({console for console, _ in data["voice_acting"]}, {"PS5"})
+
+    def test_empty_ps4_activation_keeps_ps4_prices(self):
+        data = self.parse("1000::::1800::Русский/Английский::01.01.2021")
+        self.assertEqual(data["prices"], [
+            ("PS4", "without_activation", Decimal(1000)),
+            ("PS5", "without_activation", Decimal(1000)),
+            ("PS5", "with_activation", Decimal(1800)),
+        ])
+        self.assertEqual({console for console, _ in data["voice_acting"]}, {"PS4", "PS5"})
+
+    def test_empty_required_price_is_an_error(self):
+        with self.assertRaises(ImportRowError):
+            self.parse("::1500::1800::Русский::01.01.2021")
+
+
+class CatalogImporterTest(TestCase):
+    """Потоковый импорт: пакетная запись, повторный импорт обновляет, а не дублирует."""
+
+    def setUp(self):
+        Consoles.objects.create(name="PS4")
+        Consoles.objects.create(name="PS5")
+
+    def test_import_creates_games_prices_and_languages(self):
+        rows = supplier_rows(4) + [(None, None, None, None), ("Broken", "abc::0::1::ru::x", None, None)]
+        stats = CatalogImporter().run(build_workbook(rows))
+
+        self.assertEqual((stats["created"], stats["updated"], stats["skipped"]), (4, 0, 1))
+        self.assertEqual([number for number, _ in stats["errors"]], [7])
+        ps4_game = Game.objects.get(title="Import 0")
+        ps5_game = Game.objects.get(title="Import 1")
+        self.assertEqual(ps4_game.prices.count(), 4)
+        self.assertEqual(set(ps5_game.prices.values_list("consoles__name", flat=True)), {"PS5"})
+        self.assertEqual(ps4_game.min_price, Decimal("1000.00"))
+        self.assertEqual(ps4_game.release_date, date(2021, 1, 1))
+        self.assertEqual(
+            sorted(ps4_game.voice_acting.values_list("consoles__name", "code")), [("PS4", "ru"), ("PS5", "ru")],
+        )
+        self.assertEqual(list(ps4_game.subtitle.values_list("code", flat=True)), ["en"])
+        self.assertEqual(Language.objects.count(), 3)
+        self.assertEqual(len(set(Game.objects.values_list("slug", flat=True))), 4)
+
+    def test_reimport_updates_in_place(self):
+        CatalogImporter().run(build_workbook(supplier_rows(3)))
+        stats = CatalogImporter().run(build_workbook(supplier_rows(3, price=500)))
+
+        self.assertEqual((stats["created"], stats["updated"]), (0, 3))
+        self.assertEqual(Game.objects.count(), 3)
+        self.assertEqual(Price.objects.count(), 10)
+        self.assertEqual(Game.objects.get(title="Import 0").min_price, Decimal("500.00"))
+
+    def test_unchanged_rows_are_skipped(self):
+        CatalogImporter().run(build_workbook(supplier_rows(3)))
+        updated_at = dict(Game.objects.values_list("title", "updated_at"))
+        rows = supplier_rows(3)
+        rows[1] = (f"  {rows[1][0]} ", rows[1][1].replace("::1800::", "::1800.00::"), *rows[1][2:])
+        rows[2] = (rows[2][0], rows[2][1], rows[2][2], "Новое описание")
+
+        stats = CatalogImporter().run(build_workbook(rows))
+
+        self.assertEqual((stats["created"], stats["updated"], stats["unchanged"]), (0, 1, 2))
+        self.assertEqual(stats["changes"], [("Import 2", "update")])
+        for title in ("Import 0", "Import 1"):
+            self.assertEqual(Game.objects.get(title=title).updated_at, updated_at[title])
+
+    def test_dry_run_reports_without_writing(self):
+        CatalogImporter().run(build_workbook(supplier_rows(2)))
+        stats = CatalogImporter(dry_run=True).run(build_workbook(supplier_rows(3, price=700)))
+
+        self.assertEqual((stats["created"], stats["updated"], stats["unchanged"]), (1, 2, 0))
+        self.assertEqual(sorted(stats["changes"]), [("Import 0", "update"), ("Import 1", "update"), ("Import 2", "create")])
+        self.assertEqual(Game.objects.count(), 2)
+        self.assertEqual(Game.objects.get(title="Import 0").min_price, Decimal("1000.00"))
+
+    def test_queries_do_not_grow_with_rows(self):
+        CatalogImporter().run(build_workbook(supplier_rows(1)))  # языки уже в справочнике
+        counts = []
+        for count in (5, 20):
+            Game.objects.all().delete()
+            with CaptureQueriesContext(connection) as context:
+                CatalogImporter(chunk_size=100).run(build_workbook(supplier_rows(count)))
+            counts.append(len(context.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_process_pool_parsing_matches_serial(self):
+        rows = supplier_rows(12) + [("Broken", "abc::0::1::ru::x", None, None)]
+        serial = CatalogImporter(chunk_size=4, workers=1)
+        parallel = CatalogImporter(chunk_size=4, workers=2)
+        self.assertEqual(
+            list(parallel.parse_chunks(parallel.read_chunks(build_workbook(rows)))),
+            list(serial.parse_chunks(serial.read_chunks(build_workbook(rows)))),
+        )
+
+        stats = CatalogImporter(chunk_size=4, workers=2).run(build_workbook(rows))
+        self.assertEqual((stats["processed"], stats["created"], len(stats["errors"])), (13, 12, 1))
+
+
+class ImportJobTest(TestCase):
+    """Загрузка в админке создаёт задачу импорта, страница прогресса показывает её счётчики."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        Consoles.objects.create(name="PS4")
+        Consoles.objects.create(name="PS5")
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+
+    def test_upload_runs_job_and_reports_progress(self):
+        rows = supplier_rows(3) + [("Broken", "abc::0::1::ru::x", None, None)]
+        upload = SimpleUploadedFile("supplier.xlsx", build_workbook(rows).getvalue())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("admin:game-import-excel"), {"excel_file": upload})
+
+        job = ImportJob.objects.get()
+        self.assertRedirects(response, reverse("admin:game-import-job", args=[job.id]), fetch_redirect_response=False)
+        job.refresh_from_db()
+        self.assertEqual(
+            (job.status, job.rows_processed, job.created_count, job.updated_count, job.failed_count),
+            ("done", 4, 3, 0, 1),
+        )
+        self.assertTrue(job.file.name.startswith("imports/"))
+        self.assertFalse(job.file.storage.exists(job.file.name))
+
+        page = self.client.get(reverse("admin:game-import-job", args=[job.id]))
+        self.assertContains(page, "Строка 5")
+        self.assertNotContains(page, 'http-equiv="refresh"')
+
+    def test_failed_job_keeps_message(self):
+        job = ImportJob.objects.create(file=SimpleUploadedFile("broken.xlsx", b"not a workbook"))
+        ImportJobService.run(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertTrue(job.message)
+        self.assertFalse(job.file.storage.exists(job.file.name))
+
+    def test_stale_running_job_is_failed_on_progress_page(self):
+        stale = ImportJob.objects.create(file=SimpleUploadedFile("stale.xlsx", b"stale"), status="running")
+        active = ImportJob.objects.create(file=SimpleUploadedFile("active.xlsx", b"active"), status="running")
+        ImportJob.objects.filter(id=stale.id).update(
+            updated_at=timezone.now() - timedelta(seconds=settings.IMPORT_JOB_STALE_AFTER + 1),
+        )
+
+        page = self.client.get(reverse("admin:game-import-job", args=[stale.id]))
+        self.assertNotContains(page, 'http-equiv="refresh"')
+        stale.refresh_from_db()
+        active.refresh_from_db()
+        self.assertEqual((stale.status, active.status), ("failed", "running"))
+        self.assertIsNotNone(stale.finished_at)
+        self.assertContains(page, stale.message)
+        self.assertFalse(stale.file.storage.exists(stale.file.name))
+        self.assertTrue(active.file.storage.exists(active.file.name))
+
+
+class SlugAllocatorTest(TestCase):
+    """Slug для пачки — один запрос на все базовые slug, конфликт с параллельной записью — повтор."""
+
+    def test_batch_allocation_uses_one_query(self):
+        Game.objects.create(title="Same", main_image_url="https://example.com/same.jpg")
+        allocator = SlugAllocator(Game)
+        with self.assertNumQueries(1):
+            slugs = allocator.allocate(["Same", "Same", "Other", "Same"])
+        self.assertEqual(slugs, ["same-1", "same-2", "other", "same-3"])
+
+    def test_suffixes_do_not_collide_across_bases(self):
+        self.assertEqual(SlugAllocator(Game).allocate(["Game", "Game", "Game 1"]), ["game", "game-1", "game-1-1"])
+        Game.objects.create(title="Game 1 1", main_image_url="https://example.com/game.jpg")
+        slugs = SlugAllocator(Game).allocate(["Game", "Game", "Game 1", "Game 1"])
+        self.assertEqual(slugs, ["game", "game-1", "game-1-2", "game-1-3"])
+
+    def test_reserved_slugs_are_not_allocated(self):
+        allocator = SlugAllocator(Game, reserved=Game.RESERVED_SLUGS)
+        self.assertEqual(allocator.allocate(["Batch", "Facets", "Other"]), ["batch-1", "facets-1", "other"])
+
+    def test_fallback_and_length(self):
+        allocator = SlugAllocator(Game)
+        self.assertEqual(allocator.allocate(["Игра", "!!!"]), ["game", "game-1"])
+        self.assertLessEqual(len(allocator.allocate(["Very long title " * 10])[0]), 60 - SlugAllocator.SUFFIX_RESERVE)
+
+    def test_bulk_create_retries_on_concurrent_slug(self):
+        games = [Game(title="Race", main_image_url="https://example.com/race.jpg") for _ in range(2)]
+        allocator = SlugAllocator(Game)
+        allocator.load({"race"})
+        # Другой импорт занял slug после того, как аллокатор прочитал занятые.
+        Game.objects.bulk_create([Game(title="Race", slug="race", main_image_url="https://example.com/other.jpg")])
+
+        allocator.bulk_create(games)
+
+        slugs = list(Game.objects.values_list("slug", flat=True))
+        self.assertEqual(len(set(slugs)), 3)
+        self.assertTrue(all(slug.startswith("race") for slug in slugs))
+
+    def test_save_assigns_unique_slugs(self):
+        first = Game.objects.create(title="Solo", main_image_url="https://example.com/1.jpg")
+        second = Game.objects.create(title="Solo", main_image_url="https://example.com/2.jpg")
+        self.assertEqual((first.slug, second.slug), ("solo", "solo-1"))
@@ -1,68 +1,375 @@
+import base64
+import json
+import uuid
+
+from django.conf import settings
+from django.db.models import Case, F, Q, Value, When
+from django.utils.decorators import method_decorator
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import ListAPIView
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 
+from config.cache import CATALOG, FACETS, cached_response, get_or_set
+from config.http import conditional_get, cache_headers, conditional_get_by_versions
+from config.renderers import FragmentJSONRenderer
+
+from .indexes import title_index, fuzzy_index, slug_map, facet_index, catalog_snapshot
+from .models import Game
 from .serializers import GameSerializer, GameDetailSerializer
-from .services import GameService
+from .services import GameService, GameCardService
 from .repository import GameRepository
 
 
+def resolve_game_id(game_id):
+    """Маршрут детальной страницы принимает и UUID, и slug игры."""
+    try:
+        return uuid.UUID(str(game_id))
+    except ValueError:
+        return slug_map.resolve(game_id)
+
+
+def get_game_detail_state(game_id):
+    resolved_id = resolve_game_id(game_id)
+    if resolved_id is None:
+        return None
+    return GameRepository.get_game_state(resolved_id)
+
+
+def get_selected_fields(request, serializer_class):
+    """Набор полей ответа по ?fields= / ?exclude= (None — все поля сериализатора)."""
+    return GameService.select_fields(
+        serializer_class.Meta.fields,
+        GameService.parse_fields(request.query_params.get("fields")),
+        GameService.parse_fields(request.query_params.get("exclude")),
+    )
+
+
+@method_decorator([
+    cache_headers("game_detail"),
+    cached_response("game_detail", CATALOG),
+    conditional_get(get_game_detail_state),
+], name="get")
 class GameDetail(APIView):
     def get(self, request, game_id):
         try:
-            game_id = game_id
             if not game_id:
                 return Response({"error": "game_id is required field"}, status=status.HTTP_400_BAD_REQUEST)
-            service = GameService(GameRepository())
-            game = service.get_game_detail(game_id)
-            if not game:
+            resolved_id = resolve_game_id(game_id)
+            if resolved_id is None:
                 return Response({"error": "Game not found"}, status=status.HTTP_404_NOT_FOUND)
-            serializer = GameDetailSerializer(game)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            fields = get_selected_fields(request, GameDetailSerializer)
+            payload = GameCardService.get_detail_payload(resolved_id, fields)
+            if payload is None and str(resolved_id) != game_id:
+                # slug мог перейти к другой игре в соседнем воркере
+                slug_map.forget(game_id)
+                resolved_id = slug_map.resolve(game_id)
+                payload = GameCardService.get_detail_payload(resolved_id, fields) if resolved_id else None
+            if payload is None:
+                return Response({"error": "Game not found"}, status=status.HTTP_404_NOT_FOUND)
+            return Response(payload, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({"error": f"something went wrong! {e}"}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class GameBatch(APIView):
+    """Несколько игр (UUID или slug) одним запросом — для корзины и избранного."""
+    max_ids = 50
+
+    def get_identifiers(self, request):
+        if request.method == "POST":
+            identifiers = request.data.get("ids") or []
+        else:
+            identifiers = GameService.parse_fields(request.query_params.get("ids")) or []
+        return list(dict.fromkeys(str(identifier) for identifier in identifiers))
+
+    def get(self, request):
+        try:
+            identifiers = self.get_identifiers(request)
+            if not identifiers:
+                return Response({"error": "ids is required field"}, status=status.HTTP_400_BAD_REQUEST)
+            if len(identifiers) > self.max_ids:
+                return Response({"error": f"no more than {self.max_ids} ids per request"},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            resolved, slugs = {}, []
+            for identifier in identifiers:
+                try:
+                    resolved[identifier] = uuid.UUID(identifier)
+                except ValueError:
+                    slugs.append(identifier)
+            if slugs:
+                resolved.update(slug_map.resolve_many(slugs))
+
+            fields = get_selected_fields(request, GameDetailSerializer)
+            payloads = GameCardService.get_detail_payloads(list(set(resolved.values())), fields)
+            results, not_found = [], []
+            for identifier in identifiers:
+                payload = payloads.get(resolved.get(identifier))
+                if payload is None:
+                    not_found.append(identifier)
+                else:
+                    results.append(payload)
+            return Response({"results": results, "not_found": not_found}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": f"something went wrong! {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    def post(self, request):
+        return self.get(request)
+
+
+class GameSuggest(APIView):
+    max_limit = 20
+
+    def get(self, request):
+        query = request.query_params.get("q", "")
+        try:
+            limit = min(max(int(request.query_params.get("limit", 10)), 1), self.max_limit)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(title_index.suggest(query, limit=limit), status=status.HTTP_200_OK)
+
+
 class GamePagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
 
 
+class GameCursorPagination(BasePagination):
+    """
+    Keyset-пагинация по составному ключу (поле сортировки, id) без COUNT(*)
+    и OFFSET. Курсор непрозрачен для клиента: это base64 от последнего ключа
+    на странице, поэтому стоимость любой страницы одинакова.
+    """
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    ordering = "release_date"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_ordering(self, view):
+        if view is not None and hasattr(view, "get_ordering"):
+            return view.get_ordering()
+        return self.ordering
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    @staticmethod
+    def order_queryset(queryset, ordering):
+        field_name = ordering.lstrip("-")
+        if ordering.startswith("-"):
+            return queryset.order_by(F(field_name).desc(nulls_last=True), "id")
+        return queryset.order_by(F(field_name).asc(nulls_first=True), "id")
+
+    @staticmethod
+    def after_position(ordering, value, game_id):
+        field_name = ordering.lstrip("-")
+        if value is None:
+            after = Q(**{f"{field_name}__isnull": True, "id__gt": game_id})
+            if ordering.startswith("-"):
+                return after
+            return after | Q(**{f"{field_name}__isnull": False})
+        lookup = "lt" if ordering.startswith("-") else "gt"
+        after = Q(**{f"{field_name}__{lookup}": value}) | Q(**{field_name: value, "id__gt": game_id})
+        if ordering.startswith("-"):
+            after |= Q(**{f"{field_name}__isnull": True})
+        return after
+
+    def encode_cursor(self, value, game_id):
+        position = [None if value is None else str(value), str(game_id)]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, field_name, cursor):
+        try:
+            value, game_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            field = Game._meta.get_field(field_name)
+            return (None if value is None else field.to_python(value)), Game._meta.pk.to_python(game_id)
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        ordering = self.get_ordering(view)
+        field_name = ordering.lstrip("-")
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, game_id = self.decode_cursor(field_name, cursor)
+            queryset = queryset.filter(self.after_position(ordering, value, game_id))
+
+        queryset = self.order_queryset(queryset, ordering).only("id", field_name)
+        results = list(queryset[:self.page_size + 1])
+        self.next_cursor = None
+        if len(results) > self.page_size:
+            results = results[:self.page_size]
+            last = results[-1]
+            self.next_cursor = self.encode_cursor(getattr(last, field_name), last.id)
+        return results
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+@method_decorator([
+    cache_headers("all_games"),
+    conditional_get_by_versions(CATALOG, FACETS),
+    cached_response("all_games", CATALOG, renderer_class=FragmentJSONRenderer),
+], name="get")
 class AllGames(ListAPIView):
     serializer_class = GameSerializer
+    renderer_classes = [FragmentJSONRenderer, BrowsableAPIRenderer]
     pagination_class = GamePagination
+    cursor_pagination_class = GameCursorPagination
+    ordering = "release_date"
+    ordering_fields = {
+        "release_date": "release_date",
+        "-release_date": "-release_date",
+        "price": "min_price",
+        "-price": "-min_price",
+    }
 
-    def get_queryset(self):
-        service = GameService(GameRepository())
-        queryset = service.list_available_games()
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            params = self.request.query_params
+            if params.get("pagination") == "cursor" or GameCursorPagination.cursor_query_param in params:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
-        category = self.request.query_params.get("category")
-        if category:
-            queryset = queryset.filter(categories__category=category)
+    def get_ordering(self):
+        return self.ordering_fields.get(self.request.query_params.get("ordering"), self.ordering)
 
-        min_price = self.request.query_params.get("min_price")
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
+    @staticmethod
+    def filter_catalog(queryset, params):
+        game_ids = facet_index.match(params)
+        if game_ids is not None:
+            queryset = queryset.filter(id__in=game_ids)
 
-        max_price = self.request.query_params.get("max_price")
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+        min_price = params.get("min_price")
+        max_price = params.get("max_price")
+        console = params.get("console")
+        if console and (min_price or max_price):
+            # С фильтром по консоли цена сравнивается с ценами этих консолей, а не с min_price игры.
+            queryset = GameRepository.filter_by_console_price(
+                queryset, facet_index.resolve("console", console), min_price, max_price,
+            )
+        else:
+            if min_price:
+                queryset = queryset.filter(min_price__gte=min_price)
+            if max_price:
+                queryset = queryset.filter(min_price__lte=max_price)
 
-        has_discount = self.request.query_params.get("has_discount")
+        has_discount = params.get("has_discount")
         if has_discount == "true":
-            queryset = queryset.exclude(sale_amount__isnull=True).exclude(sale_amount=0)
+            queryset = queryset.filter(has_discount=True)
 
-        title = self.request.query_params.get("title")
+        title = params.get("title")
         if title:
-            queryset = queryset.filter(title__icontains=title)
-
+            if params.get("search") == "fuzzy":
+                game_ids = fuzzy_index.search(title)
+                queryset = queryset.filter(id__in=game_ids).annotate(
+                    relevance=Case(
+                        *[When(id=game_id, then=Value(-position)) for position, game_id in enumerate(game_ids)],
+                        default=Value(-len(game_ids)),
+                    )
+                )
+            else:
+                queryset = GameRepository.search(queryset, title)
         return queryset
 
+    def get_queryset(self):
+        queryset = self.filter_catalog(GameRepository.get_available().only("id"), self.request.query_params)
+        if self.request.query_params.get("title"):
+            if "ordering" not in self.request.query_params and not isinstance(self.paginator, GameCursorPagination):
+                return queryset.order_by("-relevance", "id")
+
+        return GameCursorPagination.order_queryset(queryset, self.get_ordering())
+
+    def get_snapshot_ids(self):
+        """id страницы из колоночного снимка каталога; None — считать в базе."""
+        if not settings.CATALOG_SNAPSHOT_ENABLED or isinstance(self.paginator, GameCursorPagination):
+            return None
+        return catalog_snapshot.query(self.request.query_params, self.get_ordering())
+
     def list(self, request, *args, **kwargs):
         try:
-            return super().list(request, *args, **kwargs)
+            game_ids = self.get_snapshot_ids()
+            if game_ids is not None:
+                page = self.paginate_queryset(game_ids)
+            else:
+                page = [game.id for game in self.paginate_queryset(self.filter_queryset(self.get_queryset()))]
+            fields = get_selected_fields(request, GameSerializer)
+            payloads = GameCardService.get_list_payloads(page, fields)
+            return self.get_paginated_response(payloads)
+        except Exception as e:
+            return Response({"error": f"games not found {e}"}, status=status.HTTP_404_NOT_FOUND)
+
+
+@method_decorator([cache_headers("game_facets"), conditional_get_by_versions(CATALOG, FACETS)], name="get")
+class GameFacets(APIView):
+    filter_params = (
+        "category", "console", "publisher", "voice_acting", "subtitle",
+        "min_price", "max_price", "has_discount", "title", "search",
+    )
+
+    # Поиск по названию не зависит от регистра — в ключе кэша оно приводится к нижнему.
+    case_insensitive_params = ("title",)
+
+    def get_filters(self):
+        params = self.request.query_params
+        filters = {name: params.get(name, "").strip() for name in self.filter_params}
+        return {name: value for name, value in filters.items() if value}
+
+    def get_signature(self, filters):
+        """Ключ кэша: названия категорий и консолей ищутся с учётом регистра, их значения не меняются."""
+        return [
+            (name, value.lower() if name in self.case_insensitive_params else value)
+            for name, value in filters.items()
+        ]
+
+    def get(self, request):
+        try:
+            filters = self.get_filters()
+            facets = get_or_set(
+                CATALOG, ("facets", self.get_signature(filters)),
+                lambda: GameRepository.get_facets(
+                    AllGames.filter_catalog(GameRepository.get_available(), filters)
+                ),
+                settings.GAME_FACETS_CACHE_TIMEOUT,
+            )
+            return Response(facets, status=status.HTTP_200_OK)
         except Exception as e:
-            return Response({"error": f"games not found {e}"}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({"error": f"something went wrong! {e}"}, status=status.HTTP_400_BAD_REQUEST)
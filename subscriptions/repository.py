@@ -4,11 +4,28 @@ from .models import (
     SubscriptionPeriod,
     Subscription, SeoMetric
 )
-from django.db.models import QuerySet
-from typing import Optional
+from django.db.models import QuerySet, Count, DateTimeField, Max, Value
+from typing import Dict, Optional
 import uuid
 
 
+def get_tables_state(*querysets: QuerySet) -> list:
+    """
+    Одним запросом (UNION ALL) возвращает (max(updated_at), count) для каждого
+    переданного queryset — дешёвый валидатор для ETag/Last-Modified.
+    """
+    states = [
+        queryset.order_by()
+        .annotate(table=Value(position))
+        .values('table')
+        .annotate(latest=Max('updated_at'), total=Count('pk'))
+        .values_list('table', 'latest', 'total')
+        for position, queryset in enumerate(querysets)
+    ]
+    rows = {table: (latest, total) for table, latest, total in states[0].union(*states[1:], all=True)}
+    return [rows.get(position, (None, 0)) for position in range(len(querysets))]
+
+
 class ConsolesRepository:
     @staticmethod
     def get_all() -> QuerySet:
@@ -18,6 +35,17 @@ class ConsolesRepository:
     def get_by_id(console_id: uuid.UUID) -> Optional[Consoles]:
         return Consoles.objects.filter(id=console_id).first()
 
+    @staticmethod
+    def get_by_ids(console_ids) -> Dict[str, Consoles]:
+        return {str(console.id): console for console in Consoles.objects.filter(id__in=console_ids)}
+
+    @staticmethod
+    def get_state(pk: Optional[uuid.UUID] = None) -> list:
+        consoles = Consoles.objects.all()
+        if pk is not None:
+            consoles = consoles.filter(id=pk)
+        return get_tables_state(consoles)
+
 
 class SubscriptionServiceRepository:
     @staticmethod
@@ -28,6 +56,23 @@ class SubscriptionServiceRepository:
     def get_by_id(service_id: uuid.UUID) -> Optional[SubscriptionService]:
         return SubscriptionService.objects.filter(id=service_id).first()
 
+    @staticmethod
+    def get_by_ids(service_ids) -> Dict[str, SubscriptionService]:
+        return {str(service.id): service for service in SubscriptionService.objects.filter(id__in=service_ids)}
+
+    @staticmethod
+    def get_state(pk: Optional[uuid.UUID] = None) -> list:
+        services = SubscriptionService.objects.all()
+        periods = SubscriptionPeriod.objects.all()
+        links = SubscriptionService.consoles.through.objects.annotate(
+            updated_at=Value(None, output_field=DateTimeField())
+        )
+        if pk is not None:
+            services = services.filter(id=pk)
+            periods = periods.filter(subscription_service_id=pk)
+            links = links.filter(subscriptionservice_id=pk)
+        return get_tables_state(services, periods, links)
+
     @staticmethod
     def get_by_service(service, console_type, level = None) -> Optional[SubscriptionService]:
         return SubscriptionService.objects.filter(service, console_type, level).first()
@@ -38,6 +83,10 @@ class SubscriptionPeriodRepository:
     def get_by_id(period_id: uuid.UUID) -> Optional[SubscriptionPeriod]:
         return SubscriptionPeriod.objects.filter(id=period_id).first()
 
+    @staticmethod
+    def get_by_ids(period_ids) -> Dict[str, SubscriptionPeriod]:
+        return {str(period.id): period for period in SubscriptionPeriod.objects.filter(id__in=period_ids)}
+
     @staticmethod
     def get_periods_for_service(service: SubscriptionService) -> QuerySet:
         return service.periods.all()
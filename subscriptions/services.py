@@ -63,14 +63,29 @@ class SubscriptionServiceManager:
 
 class SubscriptionPurchaseService:
     @staticmethod
-    def prepare_subscription_purchase_items(subscription_data: dict) -> list:
+    def load_lookups(subscriptions_data: list) -> dict:
+        return {
+            "services": SubscriptionServiceRepository.get_by_ids([data['service_id'] for data in subscriptions_data]),
+            "periods": SubscriptionPeriodRepository.get_by_ids([data['period_id'] for data in subscriptions_data]),
+            "consoles": ConsolesRepository.get_by_ids([data['console_id'] for data in subscriptions_data]),
+        }
+
+    @staticmethod
+    def prepare_subscription_purchase_items(subscription_data: dict, lookups: Optional[dict] = None) -> list:
         try:
-            service = SubscriptionServiceRepository.get_by_id(subscription_data['service_id'])
-            period = SubscriptionPeriod.objects.get(
-                id=subscription_data['period_id'],
-                subscription_service=service
-            )
-            console = ConsolesRepository.get_by_id(subscription_data['console_id'])
+            if lookups is not None:
+                service = lookups["services"].get(str(subscription_data['service_id']))
+                period = lookups["periods"].get(str(subscription_data['period_id']))
+                if service is None or period is None or period.subscription_service_id != service.id:
+                    raise SubscriptionPeriod.DoesNotExist
+                console = lookups["consoles"].get(str(subscription_data['console_id']))
+            else:
+                service = SubscriptionServiceRepository.get_by_id(subscription_data['service_id'])
+                period = SubscriptionPeriod.objects.get(
+                    id=subscription_data['period_id'],
+                    subscription_service=service
+                )
+                console = ConsolesRepository.get_by_id(subscription_data['console_id'])
 
             if service.level:
                 if subscription_data.get('level') not in dict(service.CHOICES_LEVEL):
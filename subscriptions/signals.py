@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from config.cache import SUBSCRIPTIONS, bump_version
+
+from .models import Consoles, SubscriptionService, SubscriptionPeriod
+
+
+@receiver([post_save, post_delete], sender=Consoles)
+@receiver([post_save, post_delete], sender=SubscriptionService)
+@receiver([post_save, post_delete], sender=SubscriptionPeriod)
+def bump_subscriptions_version(sender, **kwargs):
+    bump_version(SUBSCRIPTIONS)
+
+
+@receiver(m2m_changed, sender=SubscriptionService.consoles.through)
+def bump_subscriptions_version_by_consoles(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(SUBSCRIPTIONS)
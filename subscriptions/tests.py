@@ -1,3 +1,86 @@
+from decimal import Decimal
+
 from django.test import TestCase
+from django.urls import reverse
+
+from config.cache import local_cache
+from games.tests import QueryBudgetMixin
+
+from .models import Consoles, SubscriptionService, SubscriptionPeriod, SeoMetric
+
+
+def seed_subscriptions(services_count):
+    consoles = [Consoles.objects.create(name=name) for name in ("PS4", "PS5")]
+    services = []
+    for i in range(services_count):
+        service = SubscriptionService.objects.create(title=f"PS Plus {i}", level="Extra")
+        service.consoles.add(*consoles)
+        for months in (1, 3, 12):
+            SubscriptionPeriod.objects.create(subscription_service=service, months=months,
+                                              price=Decimal(500 * months + i))
+        services.append(service)
+    return consoles, services
+
+
+class SubscriptionEndpointsQueryBudgetTest(QueryBudgetMixin, TestCase):
+    LIST_BUDGET = 5
+    DETAIL_BUDGET = 4
+
+    def test_subscription_services_list(self):
+        counts = []
+        for services_count in (1, 5, 10):
+            SubscriptionService.objects.all().delete()
+            Consoles.objects.all().delete()
+            seed_subscriptions(services_count)
+            counts.append(self.count_queries("get", reverse("subscriptions:subscription_services-list")))
+        self.assertQueryBudget(self.LIST_BUDGET, counts)
+
+    def test_subscription_service_detail(self):
+        _, services = seed_subscriptions(3)
+        counts = [
+            self.count_queries("get", reverse("subscriptions:subscription_services-detail", args=[service.id]))
+            for service in services
+        ]
+        self.assertQueryBudget(self.DETAIL_BUDGET, counts)
+
+    def test_subscription_services_response_cache(self):
+        _, services = seed_subscriptions(3)
+        url = reverse("subscriptions:subscription_services-list")
+        self.client.get(url)
+        self.assertQueryBudget(1, [self.count_queries("get", url)])
+
+        period = services[0].periods.get(months=1)
+        period.price = Decimal(1)
+        period.save()
+        periods = [p for item in self.client.get(url).json()["results"] for p in item["periods"] if p["id"] == str(period.id)]
+        self.assertEqual(Decimal(str(periods[0]["price"])), Decimal(1))
+
+    def test_cached_responses_hold_plain_json(self):
+        seed_subscriptions(2)
+        first = self.client.get(reverse("subscriptions:subscription_services-list")).json()
+        entries = [entry["data"]["payload"] for _, entry in local_cache._entries.values()]
+        self.assertEqual(entries, [first])
+        self.assertIs(type(entries[0]), dict)
+        self.assertIs(type(entries[0]["results"]), list)
+        self.assertEqual(self.client.get(reverse("subscriptions:subscription_services-list")).json(), first)
+
+    def test_console_types(self):
+        counts = []
+        for consoles_count in (2, 12):
+            Consoles.objects.all().delete()
+            for n in range(consoles_count):
+                Consoles.objects.create(name=f"Console {n}")
+            counts.append(self.count_queries("get", reverse("subscriptions:console_type-list")))
+        self.assertQueryBudget(3, counts)
+
+    def test_console_type_detail(self):
+        consoles = [Consoles.objects.create(name=name) for name in ("PS4", "PS5")]
+        counts = [
+            self.count_queries("get", reverse("subscriptions:console_type-detail", args=[console.id]))
+            for console in consoles
+        ]
+        self.assertQueryBudget(2, counts)
 
-# Create your tests here.
+    def test_get_seo(self):
+        SeoMetric.objects.create(code="<script></script>")
+        self.assertQueryBudget(1, [self.count_queries("get", reverse("subscriptions:metric"))])
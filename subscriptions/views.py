@@ -1,3 +1,4 @@
+from django.utils.decorators import method_decorator
 from rest_framework import viewsets, status
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
@@ -7,16 +8,36 @@ from .models import Consoles, SubscriptionService
 from .serializers import ConsolesSerializer, ServiceSerializer, PeriodSerializer, SubscriptionSerializer, \
     SeoMetricSerializer
 
+from .repository import ConsolesRepository, SubscriptionServiceRepository
 from .services import SeoMetricService
 
+from config.cache import SUBSCRIPTIONS, cached_response
+from config.http import conditional_get, cache_headers
+
+console_types_conditional = [
+    cache_headers("console_types"),
+    cached_response("console_types", SUBSCRIPTIONS),
+    conditional_get(ConsolesRepository.get_state),
+]
+subscription_services_conditional = [
+    cache_headers("subscription_services"),
+    cached_response("subscription_services", SUBSCRIPTIONS),
+    conditional_get(SubscriptionServiceRepository.get_state),
+]
+
+
+@method_decorator(console_types_conditional, name="list")
+@method_decorator(console_types_conditional, name="retrieve")
 class ConsoleTypeViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Consoles.objects.all()
     serializer_class = ConsolesSerializer
     permission_classes = [AllowAny]
 
 
+@method_decorator(subscription_services_conditional, name="list")
+@method_decorator(subscription_services_conditional, name="retrieve")
 class SubscriptionServiceViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = SubscriptionService.objects.all()
+    queryset = SubscriptionService.objects.prefetch_related('periods', 'consoles')
     serializer_class = ServiceSerializer
     permission_classes = [AllowAny]
 